@@ -1,18 +1,43 @@
+import os
+
 import numpy as np
-import matplotlib.pyplot as plt
-from PIL import Image
-import cv2
+
+from lut import build_lut, apply_lut, table_dtype
+from clahe import apply_clahe, DEFAULT_CLIP_LIMIT, DEFAULT_TILE_GRID_SIZE
+from profiling import profiled
+from image_io import decode_image, encode_image, ImageWriter, DEFAULT_QUALITY
+
+# Pixels counted per bincount call, bounds the intp temporary to 8 MB
+HISTOGRAM_CHUNK = 1 << 20
 
 # Step 1: Load and Convert Image to Grayscale
-def load_image(image_path):
-    image = Image.open(image_path).convert("L")  # Convert to grayscale
-    return np.array(image)
+@profiled("decode")
+def load_image(image_path, max_size=None, exact=True, keep_depth=False, colour=False):
+    # Convert to grayscale; max_size bounds the decode for previews (see image_io.decode_image)
+    # and keep_depth returns 16-bit grayscale images as uint16 instead of reducing them to 8 bits.
+    # colour keeps colour images as RGB, to be enhanced on their luma (see colour.py)
+    return decode_image(image_path, max_size, exact, keep_depth, colour)
 
 # Step 2: Compute Histogram
+@profiled("histogram")
 def compute_histogram(image_array):
+    # uint8 and uint16 values are their own bin index: 256 or 65536 bins, counted directly
+    if image_array.dtype == np.uint8:
+        return count_levels(image_array, 256)
+    if image_array.dtype == np.uint16:
+        return count_levels(image_array, 65536)
+
     histogram, _ = np.histogram(image_array.flatten(), bins=256, range=(0, 255))
     return histogram
 
+def count_levels(image_array, levels):
+    # Count each value over a flat view, in chunks that bound bincount's intp temporary
+    flat = image_array.reshape(-1)
+    histogram = np.zeros(levels, dtype=np.int64)
+    for start in range(0, flat.size, HISTOGRAM_CHUNK):
+        histogram += np.bincount(flat[start:start + HISTOGRAM_CHUNK], minlength=levels)
+    return histogram
+
 # Step 3: Compute PDF
 def compute_pdf(histogram):
     total_pixels = np.sum(histogram)
@@ -31,9 +56,19 @@ def compute_adaptive_pdf(pdf, mean_pdf, average_pdf):
     return adaptive_pdf
 
 # Step 6: Apply Modified PDF to Enhance Image
-def modify_image_with_pdf(image_array, adaptive_pdf):
+@profiled("lut_build")
+def compute_pdf_lut(adaptive_pdf, max_value=None):
+    # Output full scale defaults to the top bin: 255 for 256 bins, 65535 for 65536
+    max_value = len(adaptive_pdf) - 1 if max_value is None else max_value
     cdf = np.cumsum(adaptive_pdf)  # Compute CDF from Adaptive PDF
-    cdf_normalized = np.floor(cdf * 255 / cdf[-1]).astype(np.uint8)  # Normalize to [0, 255]
+    cdf_normalized = np.floor(cdf * max_value / cdf[-1]).astype(table_dtype(max_value))  # Normalize to [0, max]
+    return cdf_normalized
+
+@profiled("mapping")
+def modify_image_with_pdf(image_array, adaptive_pdf):
+    cdf_normalized = compute_pdf_lut(adaptive_pdf)
+    if image_array.dtype == np.uint16:
+        return apply_lut(image_array, cdf_normalized)  # Gathered in chunks to bound the index temporaries
     enhanced_image = cdf_normalized[image_array]  # Map original pixels to new values
     return enhanced_image
 
@@ -50,9 +85,9 @@ def compute_mean_and_average_cdf(cdf):
     return mean_cdf, average_cdf
 
 # Step 9: Adaptive CDF
-def compute_adaptive_cdf(cdf, mean_cdf, average_cdf):
-    # Apply a power-law transformation to enhance intensity differences
-    gamma = 2  # Adjust this value for more or less enhancement
+def compute_adaptive_cdf(cdf, mean_cdf, average_cdf, gamma=2):
+    # Apply a power-law transformation to enhance intensity differences;
+    # raise gamma for more enhancement, or let autotune.tune_adaptive_cdf pick it
     enhanced_cdf = np.power(cdf, gamma)
 
     # Normalize enhanced CDF to range [0, 1]
@@ -63,7 +98,9 @@ def compute_adaptive_cdf(cdf, mean_cdf, average_cdf):
     return adaptive_cdf
 
 # Step 10: Apply Modified CDF to Enhance Image
-def modify_image_with_cdf(image_array, adaptive_cdf):
+@profiled("lut_build")
+def compute_cdf_lut(adaptive_cdf, max_value=None):
+    max_value = len(adaptive_cdf) - 1 if max_value is None else max_value
     min_val = np.min(adaptive_cdf)
     max_val = np.max(adaptive_cdf)
 
@@ -73,12 +110,32 @@ def modify_image_with_cdf(image_array, adaptive_cdf):
     else:
         cdf_normalized = (adaptive_cdf - min_val) / (max_val - min_val)
 
-    cdf_normalized = np.floor(cdf_normalized * 255).astype(np.uint8)  # Map to [0, 255]
+    cdf_normalized = np.floor(cdf_normalized * max_value).astype(table_dtype(max_value))  # Map to [0, max]
+    return cdf_normalized
+
+@profiled("mapping")
+def modify_image_with_cdf(image_array, adaptive_cdf):
+    cdf_normalized = compute_cdf_lut(adaptive_cdf)
+    if image_array.dtype == np.uint16:
+        return apply_lut(image_array, cdf_normalized)
     enhanced_image = cdf_normalized[image_array]
     return enhanced_image
 
+@profiled("mapping")
+def map_with_table(image_array, table):
+    # Gather through a table that is already built (from cached statistics, say), profiled
+    # as the same mapping stage as the enhancers above
+    return apply_lut(image_array, table)
+
 # Step 11: Contrast Adjustment
+@profiled("mapping")
 def contrast_adjustment(image_array, alpha=2.5, beta=1.5):
+    # uint8 input has only 256 possible values (uint16 65536): use the cached lookup table
+    if image_array.dtype == np.uint8:
+        return apply_lut(image_array, build_lut("contrast", alpha, beta))
+    if image_array.dtype == np.uint16:
+        return apply_lut(image_array, build_lut("contrast", alpha, beta, bit_depth=16))
+
     # Normalize image to [0, 1]
     normalized_image = image_array / 255.0
 
@@ -92,6 +149,7 @@ def contrast_adjustment(image_array, alpha=2.5, beta=1.5):
 
 
 # Step 12: Gamma Correction
+@profiled("mapping")
 def gamma_correction(image_array, gamma=2.2):
     if not isinstance(image_array, np.ndarray):
         raise ValueError("Input must be a numpy array.")
@@ -99,6 +157,12 @@ def gamma_correction(image_array, gamma=2.2):
     if image_array.ndim != 2:  # Ensure image is grayscale (2D)
         raise ValueError("Only grayscale images are supported.")
 
+    # uint8 input has only 256 possible values (uint16 65536): use the cached lookup table
+    if image_array.dtype == np.uint8:
+        return apply_lut(image_array, build_lut("gamma", gamma))
+    if image_array.dtype == np.uint16:
+        return apply_lut(image_array, build_lut("gamma", gamma, bit_depth=16))
+
     # Normalize the pixel values to the range [0, 1]
     normalized_image = image_array / 255.0
 
@@ -112,107 +176,97 @@ def gamma_correction(image_array, gamma=2.2):
 
 # Step 13: Multi-Scale Enhancement
 
-def multi_scale_enhancement(image_array):
-    # Convert the image to grayscale if it's not already
+@profiled("clahe")
+def multi_scale_enhancement(image_array, clip_limit=DEFAULT_CLIP_LIMIT, tile_grid_size=DEFAULT_TILE_GRID_SIZE):
+    # Apply CLAHE with a cached instance, in parallel bands for very large images; a colour
+    # image is equalized on its luma only and keeps its chroma
     if len(image_array.shape) == 3:
-        gray_image = cv2.cvtColor(image_array, cv2.COLOR_BGR2GRAY)
-    else:
-        gray_image = image_array
-
-    # Initialize CLAHE with clip limit and tile grid size
-    clahe = cv2.createCLAHE(clipLimit=3.5, tileGridSize=(10, 10))
+        from colour import enhance_luma
+        return enhance_luma(image_array, lambda luma: apply_clahe(luma, clip_limit, tile_grid_size))
 
-    # Apply CLAHE to the grayscale image
-    enhanced_image = clahe.apply(gray_image)
-
-    # If the original image was in color, merge the enhanced grayscale with original channels
-    if len(image_array.shape) == 3:
-        enhanced_image = cv2.merge([enhanced_image] * 3)  # Merge into 3 channels (RGB)
+    return apply_clahe(image_array, clip_limit, tile_grid_size)
 
-    return np.clip(enhanced_image, 0, 255).astype(np.uint8)
+# Step 14: Save Enhanced Image
+@profiled("encode")
+def save_enhanced_image(image_array, output_path, image_format=None, quality=DEFAULT_QUALITY):
+    return encode_image(image_array, output_path, image_format, quality)
 
 # Step 15: Display Results
-def display_results(original_image, pdf_enhanced_image, cdf_enhanced_image, contrast_image, gamma_image, multi_scale_image):
-    plt.figure(figsize=(20, 10))
-
-    # Original Image
-    plt.subplot(2, 4, 1)
-    plt.title("Original Image")
-    plt.imshow(original_image, cmap="gray")
-    plt.axis("off")
-
-    # PDF Enhanced Image
-    plt.subplot(2, 4, 2)
-    plt.title("PDF Enhanced Image")
-    plt.imshow(pdf_enhanced_image, cmap="gray")
-    plt.axis("off")
-
-    # CDF Enhanced Image
-    plt.subplot(2, 4, 3)
-    plt.title("CDF Enhanced Image")
-    plt.imshow(cdf_enhanced_image, cmap="gray")
-    plt.axis("off")
-
-    # Contrast Enhanced Image
-    plt.subplot(2, 4, 4)
-    plt.title("Contrast Enhanced Image")
-    plt.imshow(contrast_image, cmap="gray")
-    plt.axis("off")
-
-    # Gamma Corrected Image
-    plt.subplot(2, 4, 5)
-    plt.title("Gamma Corrected Image")
-    plt.imshow(gamma_image, cmap="gray")
-    plt.axis("off")
-
-    # Multi-Scale Enhanced Image
-    plt.subplot(2, 4, 6)
-    plt.title("Multi-Scale Enhanced Image")
-    plt.imshow(multi_scale_image, cmap="gray")
-    plt.axis("off")
-    plt.tight_layout()
-    plt.show()
+def display_results(original_image, pdf_enhanced_image, cdf_enhanced_image, contrast_image, gamma_image, multi_scale_image,
+                    output_path="contact_sheet.png", stats=None):
+    # A headless contact sheet (see montage.py) instead of a blocking matplotlib window; with
+    # the ImageStats of the original, the PDF/CDF histogram strips follow exactly from their LUTs
+    from montage import results_sheet, save_sheet, lut_histogram
+
+    histograms = {}
+    if stats is not None:
+        histograms = {
+            "original": stats.histogram,
+            "pdf": lut_histogram(stats.histogram, stats.pdf_lut),
+            "cdf": lut_histogram(stats.histogram, stats.cdf_lut),
+        }
+    results = {
+        "pdf": pdf_enhanced_image,
+        "cdf": cdf_enhanced_image,
+        "contrast": contrast_image,
+        "gamma": gamma_image,
+        "multi_scale": multi_scale_image,
+    }
+    sheet = results_sheet(original_image, results, histograms)
+    save_sheet(sheet, output_path)
+    return sheet
 
 # Main Workflow
-def process_image(image_path, pdf_output_path, cdf_output_path, contrast_output_path, gamma_output_path, multi_scale_output_path):
-    # Load image
-    image_array = load_image(image_path)
-
-    # PDF Enhancement
-    histogram = compute_histogram(image_array)
-    pdf = compute_pdf(histogram)
-    mean_pdf, average_pdf = compute_mean_and_average_pdf(pdf)
-    adaptive_pdf = compute_adaptive_pdf(pdf, mean_pdf, average_pdf)
-    pdf_enhanced_image = modify_image_with_pdf(image_array, adaptive_pdf)
-    Image.fromarray(pdf_enhanced_image).save(pdf_output_path)
-
-    # CDF Enhancement
-    cdf = compute_cdf(histogram)
-    mean_cdf, average_cdf = compute_mean_and_average_cdf(cdf)
-    adaptive_cdf = compute_adaptive_cdf(cdf, mean_cdf, average_cdf)
-    cdf_enhanced_image = modify_image_with_cdf(image_array, adaptive_cdf)
-    Image.fromarray(cdf_enhanced_image).save(cdf_output_path)
-
-    # Contrast Adjustment
-    contrast_image = contrast_adjustment(image_array)
-    Image.fromarray(contrast_image).save(contrast_output_path)
-
-    # Gamma Correction
-    gamma_image = gamma_correction(image_array)
-    Image.fromarray(gamma_image).save(gamma_output_path)
-
-    # Multi-Scale Enhancement
-    multi_scale_image = multi_scale_enhancement(image_array)
-    Image.fromarray(multi_scale_image).save(multi_scale_output_path)
+@profiled("pipeline")
+def process_image(image_path, pdf_output_path, cdf_output_path, contrast_output_path, gamma_output_path, multi_scale_output_path,
+                  display=True, sheet_path=None, colour=False):
+    # Imported here: the pipeline graph is built from the functions in this module
+    from pipeline import enhance
+
+    # Load image; in colour mode a colour image is converted to YCrCb once, every enhancement
+    # runs on its luma and each result is recombined with the shared chroma
+    image_array = load_image(image_path, colour=colour)
+    luma, ycrcb = image_array, None
+    if image_array.ndim == 3:
+        from colour import split_luma, merge_luma
+        luma, ycrcb = split_luma(image_array)
+
+    # PDF and CDF share one histogram analysis, the independent enhancements run
+    # concurrently, and each output is encoded in the background as soon as it is ready
+    output_paths = {
+        "pdf": pdf_output_path,
+        "cdf": cdf_output_path,
+        "contrast": contrast_output_path,
+        "gamma": gamma_output_path,
+        "multi_scale": multi_scale_output_path,
+    }
+    # The contact sheet reuses the histogram analysis the PDF and CDF enhancements already made
+    outputs = list(output_paths) + (["stats"] if display else [])
+    with ImageWriter(save=save_enhanced_image) as writer:
+        def on_result(name, enhanced_image):
+            if name in output_paths:
+                if ycrcb is not None:
+                    enhanced_image = colour_results[name] = merge_luma(enhanced_image, ycrcb)
+                writer.submit(enhanced_image, output_paths[name])
+
+        colour_results = {}
+        results = enhance(luma, outputs, on_result=on_result)
+        results.update(colour_results)
 
     # Display Results
-    display_results(image_array, pdf_enhanced_image, cdf_enhanced_image, contrast_image, gamma_image, multi_scale_image)
+    if display:
+        if sheet_path is None:
+            sheet_path = os.path.join(os.path.dirname(pdf_output_path), "contact_sheet.png")
+        display_results(image_array, results["pdf"], results["cdf"], results["contrast"], results["gamma"],
+                        results["multi_scale"], sheet_path, results["stats"])
 
     print(f"PDF Enhanced Image saved to: {pdf_output_path}")
     print(f"CDF Enhanced Image saved to: {cdf_output_path}")
     print(f"Contrast Enhanced Image saved to: {contrast_output_path}")
     print(f"Gamma Corrected Image saved to: {gamma_output_path}")
     print(f"Multi-Scale Enhanced Image saved to: {multi_scale_output_path}")
+    if display:
+        print(f"Contact sheet saved to: {sheet_path}")
 
 # Example Usage
 if __name__ == "__main__":
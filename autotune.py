@@ -0,0 +1,190 @@
+"""Histogram-domain auto-tuning of enhancement parameters.
+
+Every enhancer here is a point operation: a 256-entry table applied to each
+pixel. The output histogram therefore follows exactly from the input
+histogram and the table (output bin ``table[v]`` receives input bin ``v``),
+so a candidate parameter set can be scored without rendering an image.
+Candidate tables are built as one (C, 256) array, their output histograms
+with one offset bincount, and the metrics (entropy, mean brightness, spread,
+clipping) as row-wise reductions; the whole search costs O(C x 256) however
+large the image is, and only the winner is rendered.
+
+Usage:
+    python autotune.py IMAGE [--enhancer gamma|contrast|cdf] [--output OUT.png]
+"""
+import argparse
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from NEW import compute_histogram, compute_cdf, compute_mean_and_average_cdf
+from stack import compute_adaptive_cdfs, compute_cdf_luts
+
+# Metric weights of the default score; negative weights are penalties
+DEFAULT_WEIGHTS = {"entropy": 1.0, "spread": 2.0, "mean_error": -1.0, "clipping": -2.0}
+DEFAULT_TARGET_MEAN = 0.5
+
+# Default search grids, on the GUI sliders' 0.1 steps so the scored winner is the value the slider applies
+DEFAULT_GAMMAS = np.round(np.arange(1, 51) * 0.1, 1)
+DEFAULT_ALPHAS = np.round(np.arange(1, 51) * 0.1, 1)
+DEFAULT_BETAS = np.round(np.arange(1, 16) * 0.1, 1)
+DEFAULT_CDF_GAMMAS = np.geomspace(0.25, 4.0, 121)
+
+_LEVELS = np.arange(256)
+
+TuneResult = namedtuple("TuneResult", "params score metrics candidates scores")
+
+
+def gamma_tables(gammas):
+    """(C, 256) tables of NEW.gamma_correction, one row per gamma."""
+    normalized = _LEVELS / 255.0
+    corrected = np.power(normalized, np.asarray(gammas, dtype=float)[:, None])
+    return (corrected * 255).clip(0, 255).astype(np.uint8)
+
+
+def contrast_tables(alphas, betas):
+    """(C, 256) tables of NEW.contrast_adjustment for paired alpha and beta values."""
+    normalized = _LEVELS / 255.0
+    alphas = np.asarray(alphas, dtype=float)[:, None]
+    betas = np.asarray(betas, dtype=float)[:, None]
+    with np.errstate(over="ignore"):
+        adjusted = 1 / (1 + np.exp(-alphas * (normalized - betas)))
+    return (adjusted * 255).astype(np.uint8)
+
+
+def adaptive_cdf_tables(histogram, gammas):
+    """(C, 256) tables of the adaptive CDF enhancement, one row per power-law gamma."""
+    cdf = compute_cdf(histogram)
+    mean_cdf, average_cdf = compute_mean_and_average_cdf(cdf)
+    cdfs = np.broadcast_to(cdf, (len(gammas), cdf.size))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        adaptive = compute_adaptive_cdfs(cdfs, mean_cdf, average_cdf, np.asarray(gammas, dtype=float)[:, None])
+    return compute_cdf_luts(np.nan_to_num(adaptive))
+
+
+def output_histograms(histogram, tables):
+    """Exact histograms of the images ``tables`` would produce, without rendering them."""
+    count = tables.shape[0]
+    offsets = (np.arange(count, dtype=np.intp) * 256)[:, None]
+    weights = np.broadcast_to(np.asarray(histogram, dtype=float), tables.shape)
+    counts = np.bincount((tables + offsets).ravel(), weights=weights.ravel(), minlength=count * 256)
+    return counts.reshape(count, 256)
+
+
+def histogram_metrics(histograms, target_mean=DEFAULT_TARGET_MEAN):
+    """Row-wise quality metrics of (C, 256) histograms, each in roughly [0, 1]."""
+    p = histograms / histograms.sum(axis=1, keepdims=True)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        entropy = -np.sum(np.where(p > 0, p * np.log2(p), 0.0), axis=1) / 8
+    levels = _LEVELS / 255.0
+    mean = p @ levels
+    spread = np.sqrt(np.maximum(p @ levels ** 2 - mean ** 2, 0.0))
+    return {
+        "entropy": entropy,
+        "mean": mean,
+        "mean_error": np.abs(mean - target_mean),
+        "spread": spread,
+        "clipping": p[:, 0] + p[:, 255],
+    }
+
+
+def score_metrics(metrics, weights=None):
+    weights = DEFAULT_WEIGHTS if weights is None else weights
+    return sum(weight * metrics[name] for name, weight in weights.items())
+
+
+def tune_tables(histogram, tables, candidates, weights=None, target_mean=DEFAULT_TARGET_MEAN):
+    """Score every candidate table and return the best as a ``TuneResult``.
+
+    ``candidates`` lists the parameter dict behind each table row.
+    """
+    metrics = histogram_metrics(output_histograms(histogram, tables), target_mean)
+    scores = score_metrics(metrics, weights)
+    best = int(np.argmax(scores))
+    return TuneResult(candidates[best], float(scores[best]),
+                      {name: float(values[best]) for name, values in metrics.items()}, candidates, scores)
+
+
+def tune_gamma(histogram, gammas=DEFAULT_GAMMAS, weights=None, target_mean=DEFAULT_TARGET_MEAN):
+    candidates = [{"gamma": float(gamma)} for gamma in gammas]
+    return tune_tables(histogram, gamma_tables(gammas), candidates, weights, target_mean)
+
+
+def tune_contrast(histogram, alphas=DEFAULT_ALPHAS, betas=DEFAULT_BETAS, weights=None,
+                  target_mean=DEFAULT_TARGET_MEAN):
+    """Search the full alpha x beta grid."""
+    alpha_grid, beta_grid = (grid.ravel() for grid in np.meshgrid(alphas, betas, indexing="ij"))
+    candidates = [{"alpha": float(alpha), "beta": float(beta)} for alpha, beta in zip(alpha_grid, beta_grid)]
+    return tune_tables(histogram, contrast_tables(alpha_grid, beta_grid), candidates, weights, target_mean)
+
+
+def tune_adaptive_cdf(histogram, gammas=DEFAULT_CDF_GAMMAS, weights=None, target_mean=DEFAULT_TARGET_MEAN):
+    """Tune the power-law gamma of NEW.compute_adaptive_cdf."""
+    candidates = [{"gamma": float(gamma)} for gamma in gammas]
+    return tune_tables(histogram, adaptive_cdf_tables(histogram, gammas), candidates, weights, target_mean)
+
+
+TUNERS = {
+    "gamma": tune_gamma,
+    "contrast": tune_contrast,
+    "cdf": tune_adaptive_cdf,
+}
+
+
+def render(image_array, enhancer, params):
+    """Render the tuned result with the regular NEW.py code path."""
+    from NEW import (
+        contrast_adjustment, gamma_correction, modify_image_with_cdf, compute_adaptive_cdf
+    )
+
+    if enhancer == "gamma":
+        return gamma_correction(image_array, params["gamma"])
+    if enhancer == "contrast":
+        return contrast_adjustment(image_array, params["alpha"], params["beta"])
+    if enhancer == "cdf":
+        cdf = compute_cdf(compute_histogram(image_array))
+        adaptive_cdf = compute_adaptive_cdf(cdf, *compute_mean_and_average_cdf(cdf), gamma=params["gamma"])
+        return modify_image_with_cdf(image_array, adaptive_cdf)
+    raise ValueError(f"Unknown enhancer: {enhancer}")
+
+
+def auto_enhance(image_array, enhancer="gamma", **options):
+    """Tune ``enhancer`` on the image's histogram and render only the winner.
+
+    Returns (enhanced image, ``TuneResult``).
+    """
+    if enhancer not in TUNERS:
+        raise ValueError(f"Unknown enhancer: {enhancer}")
+    result = TUNERS[enhancer](compute_histogram(image_array), **options)
+    return render(image_array, enhancer, result.params), result
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Pick enhancement parameters from the image histogram.")
+    parser.add_argument("image", help="Input image")
+    parser.add_argument("--enhancer", choices=sorted(TUNERS), default="gamma")
+    parser.add_argument("--target-mean", type=float, default=DEFAULT_TARGET_MEAN,
+                        help="Preferred mean brightness in [0, 1] (default: 0.5)")
+    parser.add_argument("--output", help="Write the winning enhancement here")
+    args = parser.parse_args(argv)
+
+    from NEW import load_image, save_enhanced_image
+
+    image_array = load_image(args.image)
+    histogram = compute_histogram(image_array)
+    start = time.perf_counter()
+    result = TUNERS[args.enhancer](histogram, target_mean=args.target_mean)
+    elapsed = time.perf_counter() - start
+
+    params = ", ".join(f"{name}={value:.3f}" for name, value in result.params.items())
+    metrics = ", ".join(f"{name} {value:.3f}" for name, value in result.metrics.items())
+    print(f"{args.enhancer}: {params} (score {result.score:.3f}; {metrics})")
+    print(f"Scored {len(result.candidates)} candidates in {elapsed * 1000:.1f} ms")
+    if args.output:
+        save_enhanced_image(render(image_array, args.enhancer, result.params), args.output)
+        print(f"Saved to: {args.output}")
+
+
+if __name__ == "__main__":
+    main()
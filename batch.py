@@ -0,0 +1,395 @@
+"""Headless batch enhancement of whole directories.
+
+Usage:
+    python batch.py INPUT OUTPUT_DIR [--enhancers pdf,cdf,gamma] [--workers N]
+
+INPUT is a directory or a glob pattern. Each input file is decoded, enhanced
+and encoded inside a worker process, so only the files currently in flight are
+held in memory. Outputs mirror the subdirectories of the inputs, and two
+inputs that would write the same output (x.jpg and x.png) stop the batch
+before it starts. Outputs that are newer than their input are skipped, and
+outputs found in the result cache (see cache.py) are copied without decoding.
+With --report a contact sheet of every input and its outputs is written to
+OUTPUT_DIR/sheets, decoded at tile size, and indexed by report.html and
+report.json (see montage.py). With --colour colour inputs keep their colour:
+they are converted to YCrCb once and every enhancer runs on the luma plane
+(see colour.py).
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, FIRST_COMPLETED, wait
+
+from PIL import Image
+
+from cache import ResultCache, file_digest, format_counters, DEFAULT_CACHE_DIR, DEFAULT_MAX_BYTES
+from image_io import decode_image, encode_image, DEFAULT_QUALITY
+from montage import Panel, TITLES, DEFAULT_TILE_SIZE, contact_sheet, save_sheet, lut_histogram, histogram_summary, \
+    write_report
+from colour import split_luma, merge_luma
+from NEW import load_image, compute_histogram, contrast_adjustment, gamma_correction, multi_scale_enhancement, \
+    map_with_table
+from stats import ImageStats
+
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff", ".webp")
+
+
+def _pdf(image_array, stats):
+    return map_with_table(image_array, stats.pdf_lut)
+
+def _cdf(image_array, stats):
+    return map_with_table(image_array, stats.cdf_lut)
+
+def _contrast(image_array, stats):
+    return contrast_adjustment(image_array)
+
+def _gamma(image_array, stats):
+    return gamma_correction(image_array)
+
+def _multi_scale(image_array, stats):
+    return multi_scale_enhancement(image_array)
+
+
+ENHANCERS = {
+    "pdf": _pdf,
+    "cdf": _cdf,
+    "contrast": _contrast,
+    "gamma": _gamma,
+    "multi_scale": _multi_scale,
+}
+
+
+def find_inputs(pattern, recursive=False):
+    """Expand a directory or glob pattern into a sorted list of image files."""
+    if os.path.isdir(pattern):
+        pattern = os.path.join(pattern, "**", "*") if recursive else os.path.join(pattern, "*")
+    paths = glob.glob(pattern, recursive=recursive)
+    return sorted(p for p in paths if os.path.isfile(p) and p.lower().endswith(IMAGE_EXTENSIONS))
+
+
+def input_root(inputs):
+    """Deepest directory containing every input; outputs mirror the layout below it."""
+    return os.path.commonpath([os.path.dirname(path) or os.curdir for path in inputs]) if inputs else os.curdir
+
+
+def output_path(input_path, output_dir, enhancer, ext, root=None):
+    """Output of ``enhancer`` for ``input_path``; with a ``root`` it keeps the input's subdirectory below it."""
+    stem = os.path.splitext(os.path.basename(input_path))[0]
+    if root is not None:
+        subdir = os.path.relpath(os.path.dirname(input_path) or os.curdir, root)
+        output_dir = os.path.normpath(os.path.join(output_dir, subdir))
+    return os.path.join(output_dir, f"{stem}_{enhancer}{ext}")
+
+
+def plan_outputs(inputs, output_dir, enhancers, ext):
+    """(input_path, {enhancer: output_path}) for every input.
+
+    Raises ValueError when two inputs would write the same output, such as
+    x.jpg and x.png in one directory.
+    """
+    root = input_root(inputs)
+    planned = []
+    owners = {}
+    for input_path in inputs:
+        outputs = {name: output_path(input_path, output_dir, name, ext, root) for name in enhancers}
+        for out_path in outputs.values():
+            owner = owners.setdefault(os.path.normcase(out_path), input_path)
+            if owner != input_path:
+                raise ValueError(f"{owner} and {input_path} would both be written to {out_path}")
+        planned.append((input_path, outputs))
+    return planned
+
+
+def is_up_to_date(input_path, out_path):
+    try:
+        return os.path.getmtime(out_path) >= os.path.getmtime(input_path)
+    except OSError:
+        return False
+
+
+_worker_cache = None
+
+
+def get_worker_cache(cache_dir, cache_bytes):
+    # One cache object per worker process, so its counters cover every file the worker handles
+    global _worker_cache
+    if _worker_cache is None or (_worker_cache.directory, _worker_cache.max_bytes) != (cache_dir, cache_bytes):
+        _worker_cache = ResultCache(cache_dir, cache_bytes)
+    return _worker_cache
+
+
+def process_file(input_path, outputs, quality=DEFAULT_QUALITY, exact=True, cache_dir=None,
+                 cache_bytes=DEFAULT_MAX_BYTES, colour=False):
+    """Decode one file, run the requested enhancers and encode their results.
+
+    ``outputs`` maps enhancer name to output path. Runs inside a worker process
+    and returns the cache counters of this file.
+    """
+    cache = get_worker_cache(cache_dir, cache_bytes) if cache_dir else None
+    if cache is None:
+        _enhance_file(input_path, outputs, quality, exact, colour=colour)
+        return None
+
+    before = cache.counters()
+    input_hash = file_digest(input_path)
+    keys = {name: cache.key(input_hash, name, ext=os.path.splitext(out_path)[1].lower(), quality=quality, exact=exact,
+                            colour=colour)
+            for name, out_path in outputs.items()}
+    missing = {name: out_path for name, out_path in outputs.items() if not copy_cached(cache, keys[name], out_path)}
+    if missing:
+        _enhance_file(input_path, missing, quality, exact, cache, input_hash, keys, colour)
+    return {name: count - before[name] for name, count in cache.counters().items()}
+
+
+def _enhance_file(input_path, outputs, quality, exact, cache=None, input_hash=None, keys=None, colour=False):
+    image_array = load_image(input_path, exact=exact, colour=colour)
+    # A colour image is split once; the enhancers and statistics only see its luma
+    ycrcb = None
+    if image_array.ndim == 3:
+        image_array, ycrcb = split_luma(image_array)
+    stats = None
+    if {"pdf", "cdf"} & outputs.keys():
+        stats = cached_stats(cache, input_hash, image_array, exact, colour) if cache \
+            else ImageStats.from_image(image_array)
+    for name, out_path in outputs.items():
+        enhanced = ENHANCERS[name](image_array, stats)
+        save_atomic(enhanced if ycrcb is None else merge_luma(enhanced, ycrcb), out_path, quality)
+        if cache is not None:
+            cache.put_file(keys[name], os.path.splitext(out_path)[1].lower(), out_path)
+
+
+def histogram_key(cache, input_hash, exact, colour=False):
+    # The colour path's luma comes from OpenCV rather than PIL, so it is cached separately
+    return cache.key(input_hash, "histogram", exact=exact, colour=colour)
+
+
+def cached_stats(cache, input_hash, image_array, exact, colour=False):
+    # The histogram is all the PDF/CDF enhancers need from the pixels; their LUTs derive from it
+    key = histogram_key(cache, input_hash, exact, colour)
+    histogram = cache.get_array(key)
+    if histogram is not None:
+        return ImageStats(histogram)
+    stats = ImageStats.from_image(image_array)
+    cache.put_array(key, stats.histogram)
+    return stats
+
+
+def copy_cached(cache, key, out_path):
+    os.makedirs(os.path.dirname(out_path) or os.curdir, exist_ok=True)
+    tmp_path = f"{out_path}.tmp{os.getpid()}"
+    if not cache.get_file(key, os.path.splitext(out_path)[1].lower(), tmp_path):
+        return False
+    os.replace(tmp_path, out_path)
+    return True
+
+
+def save_atomic(image_array, out_path, quality=DEFAULT_QUALITY):
+    # Write to a temporary name so an interrupted job never leaves a file that looks up to date
+    os.makedirs(os.path.dirname(out_path) or os.curdir, exist_ok=True)
+    image_format = Image.registered_extensions()[os.path.splitext(out_path)[1].lower()]
+    tmp_path = f"{out_path}.tmp{os.getpid()}"
+    encode_image(image_array, tmp_path, image_format, quality)
+    os.replace(tmp_path, out_path)
+
+
+def sheet_file(input_path, outputs, sheet_path, exact=True, cache_dir=None, cache_bytes=DEFAULT_MAX_BYTES,
+               tile_size=DEFAULT_TILE_SIZE, colour=False):
+    """Write the contact sheet of one input and its existing outputs; returns its report entry.
+
+    Every image is decoded straight to tile size. The original's histogram
+    comes from the result cache when it holds one, and then the PDF/CDF
+    histograms follow exactly from their LUTs; other panels use their tile's.
+    """
+    histogram = None
+    if cache_dir:
+        cache = get_worker_cache(cache_dir, cache_bytes)
+        histogram = cache.get_array(histogram_key(cache, file_digest(input_path), exact, colour))
+    stats = ImageStats(histogram) if histogram is not None else None
+
+    panels = {"original": Panel(TITLES["original"], decode_image(input_path, tile_size, exact, colour=colour),
+                                histogram)}
+    for name, out_path in outputs.items():
+        output_histogram = None
+        if stats is not None and name in ("pdf", "cdf"):
+            output_histogram = lut_histogram(histogram, stats.pdf_lut if name == "pdf" else stats.cdf_lut)
+        panels[name] = Panel(TITLES.get(name, name), decode_image(out_path, tile_size, colour=colour),
+                             output_histogram)
+
+    save_sheet(contact_sheet(list(panels.values()), tile_size=tile_size), sheet_path)
+    summaries = {}
+    for name, panel in panels.items():
+        image = panel.image if panel.image.ndim == 2 else split_luma(panel.image)[0]
+        panel_histogram = panel.histogram if panel.histogram is not None else compute_histogram(image)
+        summaries[name] = {"output": input_path if name == "original" else outputs[name],
+                           **histogram_summary(panel_histogram)}
+    return {"input": input_path, "panels": summaries}
+
+
+def run_report(inputs, output_dir, enhancers, ext=".png", workers=None, report=print, exact=True, cache_dir=None,
+               cache_bytes=DEFAULT_MAX_BYTES, colour=False):
+    """Write contact sheets of ``inputs`` and their outputs plus report.html/report.json; returns the HTML path."""
+    sheet_dir = os.path.join(output_dir, "sheets")
+    root = input_root(inputs)
+    workers = workers or os.cpu_count() or 1
+    entries = {}
+
+    def tasks():
+        for index, (input_path, outputs) in enumerate(plan_outputs(inputs, output_dir, enhancers, ext)):
+            outputs = {name: out_path for name, out_path in outputs.items() if os.path.exists(out_path)}
+            sheet_path = output_path(input_path, sheet_dir, "sheet", ".png", root)
+            os.makedirs(os.path.dirname(sheet_path), exist_ok=True)
+            yield (index, sheet_path), sheet_file, input_path, outputs, sheet_path, exact, cache_dir, cache_bytes, \
+                DEFAULT_TILE_SIZE, colour
+
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for finished in submit_bounded(executor, tasks(), workers * 2):
+            for future, (index, sheet_path) in finished:
+                try:
+                    entry = future.result()
+                except Exception as e:
+                    report(f"No contact sheet for {sheet_path}: {e}")
+                    continue
+                entry["sheet"] = os.path.relpath(sheet_path, output_dir).replace(os.sep, "/")
+                entries[index] = entry
+    # Entries finish out of order; the report lists them in input order
+    return write_report([entries[index] for index in sorted(entries)], output_dir)[1]
+
+
+def plan_jobs(inputs, output_dir, enhancers, ext, force=False):
+    """List (input_path, {enhancer: output_path}) for files with stale outputs.
+
+    Every output is planned before anything runs, so colliding outputs fail
+    the batch up front (see ``plan_outputs``).
+    """
+    jobs = []
+    for input_path, outputs in plan_outputs(inputs, output_dir, enhancers, ext):
+        outputs = {name: out_path for name, out_path in outputs.items()
+                   if force or not is_up_to_date(input_path, out_path)}
+        if outputs:
+            jobs.append((input_path, outputs))
+    return jobs
+
+
+def run_batch(inputs, output_dir, enhancers, ext=".png", workers=None, force=False, report=print,
+              quality=DEFAULT_QUALITY, exact=True, cache_dir=None, cache_bytes=DEFAULT_MAX_BYTES, colour=False):
+    """Enhance ``inputs`` across a process pool. Returns (done, skipped, failed).
+
+    With a ``cache_dir`` the result cache is consulted first and its counters
+    are reported at the end.
+    """
+    jobs = plan_jobs(inputs, output_dir, enhancers, ext, force)
+    os.makedirs(output_dir, exist_ok=True)
+    workers = workers or os.cpu_count() or 1
+
+    done = failed = bytes_in = 0
+    cache_counters = {}
+    start = time.perf_counter()
+    tasks = ((input_path, process_file, input_path, outputs, quality, exact, cache_dir, cache_bytes, colour)
+             for input_path, outputs in jobs)
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for finished in submit_bounded(executor, tasks, workers * 2):
+            for future, input_path in finished:
+                ok, size = _collect(future, input_path, report, cache_counters)
+                done += ok
+                failed += not ok
+                bytes_in += size
+            _report_progress(done, failed, bytes_in, start, report)
+
+    if cache_counters:
+        report(format_counters(cache_counters))
+    skipped = len(inputs) - len(jobs)
+    return done, skipped, failed
+
+
+def submit_bounded(executor, tasks, limit):
+    """Submit ``(tag, func, *args)`` tasks with at most ``limit`` in flight, instead of all up front.
+
+    Yields lists of (future, tag) as they finish; the last list holds every
+    task still running once all have been submitted.
+    """
+    pending = {}
+    for tag, func, *args in tasks:
+        if len(pending) >= limit:
+            finished, _ = wait(pending, return_when=FIRST_COMPLETED)
+            yield [(future, pending.pop(future)) for future in finished]
+        pending[executor.submit(func, *args)] = tag
+    if pending:
+        yield list(pending.items())
+
+
+def _collect(future, input_path, report, cache_counters):
+    try:
+        counters = future.result()
+    except Exception as e:
+        report(f"Failed: {input_path}: {e}")
+        return False, 0
+    for name, count in (counters or {}).items():
+        cache_counters[name] = cache_counters.get(name, 0) + count
+    return True, os.path.getsize(input_path)
+
+
+def _report_progress(done, failed, bytes_in, start, report):
+    elapsed = max(time.perf_counter() - start, 1e-9)
+    report(f"{done} done, {failed} failed | {done / elapsed:.2f} images/s, "
+           f"{bytes_in / elapsed / 1e6:.2f} MB/s")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Enhance every image in a directory or glob.")
+    parser.add_argument("input", help="Input directory or glob pattern")
+    parser.add_argument("output_dir", help="Directory for enhanced images")
+    parser.add_argument("--enhancers", default=",".join(ENHANCERS),
+                        help=f"Comma-separated subset of: {', '.join(ENHANCERS)}")
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--ext", default=".png", help="Output file extension (default: .png)")
+    parser.add_argument("--recursive", action="store_true", help="Search input directories recursively")
+    parser.add_argument("--force", action="store_true", help="Rewrite outputs even if up to date")
+    parser.add_argument("--quality", type=int, default=DEFAULT_QUALITY,
+                        help=f"JPEG/WebP quality; 100 makes WebP lossless (default: {DEFAULT_QUALITY})")
+    parser.add_argument("--fast-decode", action="store_true",
+                        help="Decode JPEG inputs from their luma channel (faster, may differ by a level or two)")
+    parser.add_argument("--cache-dir", default=DEFAULT_CACHE_DIR, help=f"Result cache (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--cache-mb", type=float, default=DEFAULT_MAX_BYTES / 2**20,
+                        help="Result cache size limit in MB (default: 1024)")
+    parser.add_argument("--no-cache", action="store_true", help="Neither read nor fill the result cache")
+    parser.add_argument("--colour", action="store_true",
+                        help="Keep colour inputs in colour, enhancing their luma only")
+    parser.add_argument("--report", action="store_true",
+                        help="Write contact sheets and report.html/report.json to OUTPUT_DIR")
+    args = parser.parse_args(argv)
+
+    enhancers = [name.strip() for name in args.enhancers.split(",") if name.strip()]
+    unknown = [name for name in enhancers if name not in ENHANCERS]
+    if unknown:
+        parser.error(f"Unknown enhancers: {', '.join(unknown)}")
+    ext = args.ext if args.ext.startswith(".") else "." + args.ext
+    if ext.lower() not in Image.registered_extensions():
+        parser.error(f"Unsupported output extension: {ext}")
+
+    inputs = find_inputs(args.input, args.recursive)
+    if not inputs:
+        parser.error(f"No images found for: {args.input}")
+
+    report = lambda message: print(message, file=sys.stderr)
+    cache_dir = None if args.no_cache else args.cache_dir
+    start = time.perf_counter()
+    try:
+        done, skipped, failed = run_batch(inputs, args.output_dir, enhancers, ext, args.workers, args.force, report,
+                                          args.quality, not args.fast_decode, cache_dir, int(args.cache_mb * 2**20),
+                                          args.colour)
+    except ValueError as e:
+        parser.error(str(e))
+    report(f"Processed {done} images ({skipped} up to date, {failed} failed) "
+           f"in {time.perf_counter() - start:.1f}s")
+    if args.report:
+        start = time.perf_counter()
+        html_path = run_report(inputs, args.output_dir, enhancers, ext, args.workers, report, not args.fast_decode,
+                               cache_dir, int(args.cache_mb * 2**20), args.colour)
+        report(f"Report of {len(inputs)} images written to {html_path} in {time.perf_counter() - start:.1f}s")
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,247 @@
+"""Benchmark suite for the NEW.py enhancement steps.
+
+Every (step, size, distribution) case runs in a fresh worker process on a
+deterministic synthetic image, so the reported peak RSS belongs to that case
+alone. Results are written as JSON and can be compared against a stored
+baseline, failing when throughput drops by more than a threshold.
+
+Usage:
+    python benchmark.py [--sizes 1,12] [--steps compute_histogram,gamma_correction]
+                        [--output results.json] [--baseline baseline.json] [--threshold 0.1]
+                        [--save-baseline baseline.json]
+"""
+import argparse
+import contextlib
+import io
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+DISTRIBUTIONS = ("uniform", "low_contrast", "bimodal", "dark")
+SIZES_MP = (1, 12, 50, 200)
+STEPS = (
+    "load_image", "compute_histogram", "modify_image_with_pdf", "modify_image_with_cdf",
+    "contrast_adjustment", "gamma_correction", "multi_scale_enhancement", "process_image",
+)
+DEFAULT_THRESHOLD = 0.10
+
+# Rows generated per random draw, bounds the float64 temporaries of large images
+_GENERATE_ROWS = 256
+
+
+def image_shape(megapixels):
+    """4:3 landscape shape with about ``megapixels`` million pixels."""
+    width = int(round(np.sqrt(megapixels * 1e6 * 4 / 3)))
+    return int(round(megapixels * 1e6 / width)), width
+
+
+def synthetic_image(megapixels, distribution, seed=0):
+    """Deterministic uint8 test image with the given intensity distribution."""
+    if distribution not in DISTRIBUTIONS:
+        raise ValueError(f"Unknown distribution: {distribution}")
+    height, width = image_shape(megapixels)
+    image_array = np.empty((height, width), dtype=np.uint8)
+    for start in range(0, height, _GENERATE_ROWS):
+        rows = min(_GENERATE_ROWS, height - start)
+        rng = np.random.default_rng([seed, DISTRIBUTIONS.index(distribution), start])
+        if distribution == "uniform":
+            band = rng.integers(0, 256, (rows, width), dtype=np.uint8)
+        else:
+            if distribution == "low_contrast":
+                values = rng.normal(128, 12, (rows, width))
+            elif distribution == "bimodal":
+                values = np.where(rng.random((rows, width)) < 0.5,
+                                  rng.normal(60, 15, (rows, width)), rng.normal(190, 15, (rows, width)))
+            else:
+                values = rng.exponential(25, (rows, width))
+            band = np.clip(values, 0, 255).astype(np.uint8)
+        image_array[start:start + rows] = band
+    return image_array
+
+
+def _peak_rss_mb():
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if sys.platform == "darwin" else peak / 1024
+
+
+def _prepare(step, image_array, workdir):
+    """Return a zero-argument callable running ``step`` on ``image_array``."""
+    import NEW
+
+    if step == "load_image":
+        path = os.path.join(workdir, "input.png")
+        from PIL import Image
+        Image.fromarray(image_array).save(path, compress_level=1)
+        return lambda: NEW.load_image(path)
+    if step == "compute_histogram":
+        return lambda: NEW.compute_histogram(image_array)
+    if step == "modify_image_with_pdf":
+        pdf = NEW.compute_pdf(NEW.compute_histogram(image_array))
+        adaptive_pdf = NEW.compute_adaptive_pdf(pdf, *NEW.compute_mean_and_average_pdf(pdf))
+        return lambda: NEW.modify_image_with_pdf(image_array, adaptive_pdf)
+    if step == "modify_image_with_cdf":
+        cdf = NEW.compute_cdf(NEW.compute_histogram(image_array))
+        adaptive_cdf = NEW.compute_adaptive_cdf(cdf, *NEW.compute_mean_and_average_cdf(cdf))
+        return lambda: NEW.modify_image_with_cdf(image_array, adaptive_cdf)
+    if step == "contrast_adjustment":
+        return lambda: NEW.contrast_adjustment(image_array)
+    if step == "gamma_correction":
+        return lambda: NEW.gamma_correction(image_array)
+    if step == "multi_scale_enhancement":
+        return lambda: NEW.multi_scale_enhancement(image_array)
+    if step == "process_image":
+        path = os.path.join(workdir, "input.png")
+        from PIL import Image
+        Image.fromarray(image_array).save(path, compress_level=1)
+        outputs = [os.path.join(workdir, f"{name}.png") for name in ("pdf", "cdf", "contrast", "gamma", "multi")]
+
+        def run():
+            with contextlib.redirect_stdout(io.StringIO()):
+                NEW.process_image(path, *outputs, display=False)
+        return run
+    raise ValueError(f"Unknown step: {step}")
+
+
+def run_case(step, megapixels, distribution, repeats=3):
+    """Time one case in the current process and return its result record."""
+    image_array = synthetic_image(megapixels, distribution)
+    with tempfile.TemporaryDirectory() as workdir:
+        func = _prepare(step, image_array, workdir)
+        func()  # Warm up imports, caches and lazily built tables
+        rss_before = _peak_rss_mb()
+        best = float("inf")
+        for _ in range(repeats):
+            start = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - start)
+        rss_after = _peak_rss_mb()
+        # tracemalloc hooks every allocation, so peak allocation comes from a separate untimed run
+        tracemalloc.start()
+        func()
+        _, peak_alloc = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+    return {
+        "step": step,
+        "megapixels": megapixels,
+        "distribution": distribution,
+        "shape": list(image_array.shape),
+        "seconds": best,
+        "mp_per_s": image_array.size / 1e6 / best,
+        "peak_rss_mb": rss_after,
+        "peak_rss_before_mb": rss_before,
+        "peak_alloc_mb": peak_alloc / (1024 * 1024),
+    }
+
+
+def run_suite(steps=STEPS, sizes=SIZES_MP, distributions=DISTRIBUTIONS, repeats=3, report=None):
+    """Run every case in its own spawned process and return the JSON document."""
+    results = []
+    context = multiprocessing.get_context("spawn")
+    for megapixels in sizes:
+        for distribution in distributions:
+            for step in steps:
+                with ProcessPoolExecutor(max_workers=1, mp_context=context) as executor:
+                    result = executor.submit(run_case, step, megapixels, distribution, repeats).result()
+                results.append(result)
+                if report is not None:
+                    report(result)
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "machine": platform.machine(),
+            "processor": platform.processor(),
+            "cpu_count": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        },
+        "results": results,
+    }
+
+
+def _case_key(result):
+    return result["step"], result["megapixels"], result["distribution"]
+
+
+def compare(current, baseline, threshold=DEFAULT_THRESHOLD):
+    """Return records of cases whose throughput fell more than ``threshold`` below baseline."""
+    baseline_results = {_case_key(result): result for result in baseline["results"]}
+    regressions = []
+    for result in current["results"]:
+        reference = baseline_results.get(_case_key(result))
+        if reference is None:
+            continue
+        change = result["mp_per_s"] / reference["mp_per_s"] - 1
+        if change < -threshold:
+            regressions.append({"step": result["step"], "megapixels": result["megapixels"],
+                                "distribution": result["distribution"],
+                                "baseline_mp_per_s": reference["mp_per_s"],
+                                "mp_per_s": result["mp_per_s"], "change": change})
+    return regressions
+
+
+def _print_result(result):
+    print(f"{result['step']:<26} {result['megapixels']:>6g} MP {result['distribution']:<13} "
+          f"{result['seconds'] * 1000:>10.1f} ms {result['mp_per_s']:>9.1f} MP/s "
+          f"{result['peak_rss_mb']:>9.1f} MB RSS", file=sys.stderr)
+
+
+def _parse_list(text, choices=None, cast=str):
+    values = [cast(value.strip()) for value in text.split(",") if value.strip()]
+    if choices is not None:
+        unknown = [value for value in values if value not in choices]
+        if unknown:
+            raise argparse.ArgumentTypeError(f"unknown values: {', '.join(map(str, unknown))}")
+    return values
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark the enhancement steps.")
+    parser.add_argument("--steps", type=lambda text: _parse_list(text, STEPS), default=list(STEPS))
+    parser.add_argument("--sizes", type=lambda text: _parse_list(text, cast=float), default=list(SIZES_MP),
+                        help="Comma-separated image sizes in megapixels (default: 1,12,50,200)")
+    parser.add_argument("--distributions", type=lambda text: _parse_list(text, DISTRIBUTIONS),
+                        default=list(DISTRIBUTIONS))
+    parser.add_argument("--repeats", type=int, default=3, help="Timed runs per case; the best is kept")
+    parser.add_argument("--output", help="Write results JSON here (default: stdout)")
+    parser.add_argument("--baseline", help="Baseline JSON to compare against")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD,
+                        help="Allowed throughput drop before a case counts as a regression (default: 0.1)")
+    parser.add_argument("--save-baseline", help="Also write the results as a new baseline")
+    args = parser.parse_args(argv)
+
+    document = run_suite(args.steps, args.sizes, args.distributions, args.repeats, _print_result)
+    if args.baseline:
+        with open(args.baseline) as f:
+            document["regressions"] = compare(document, json.load(f), args.threshold)
+        document["threshold"] = args.threshold
+
+    text = json.dumps(document, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+    if args.save_baseline:
+        with open(args.save_baseline, "w") as f:
+            f.write(text)
+
+    for regression in document.get("regressions", []):
+        print(f"REGRESSION {regression['step']} {regression['megapixels']:g} MP {regression['distribution']}: "
+              f"{regression['baseline_mp_per_s']:.1f} -> {regression['mp_per_s']:.1f} MP/s "
+              f"({regression['change']:+.0%})", file=sys.stderr)
+    return 1 if document.get("regressions") else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,229 @@
+"""Content-addressed on-disk cache of enhancement results.
+
+Entries are keyed by a hash of (input content, enhancer name, parameters,
+code version), so a changed image, a different setting or an edit to the
+enhancement code never returns a stale result. Encoded outputs are stored as
+files in their output format and intermediates (histograms, full-resolution
+arrays) as ``.npy``; a hit copies or loads the entry without any pixel work.
+
+Every write goes to a temporary file that is atomically renamed into place,
+so several processes can share one cache directory: readers only ever see
+complete entries and a racing writer merely replaces an identical file.
+Hits refresh an entry's modification time, and eviction deletes the least
+recently used entries once the directory exceeds its size limit.
+
+Usage:
+    python cache.py [--dir DIR] [--clear] [--max-mb 1024]
+"""
+import argparse
+import functools
+import hashlib
+import importlib.util
+import json
+import os
+import shutil
+import tempfile
+import threading
+
+import numpy as np
+
+DEFAULT_CACHE_DIR = os.environ.get(
+    "ENHANCE_CACHE_DIR", os.path.join(os.path.expanduser("~"), ".cache", "adaptive-image-enhancement"))
+DEFAULT_MAX_BYTES = 1 << 30
+
+# Modules whose source decides the pixels of a result; editing any of them invalidates the cache
+CODE_MODULES = ("NEW", "lut", "stats", "clahe", "image_io", "pyramid", "colour", "batch")
+
+# Evict after this fraction of the size limit has been written since the last check
+_EVICT_FRACTION = 16
+
+_HASH_CHUNK = 1 << 20
+
+
+@functools.lru_cache(maxsize=None)
+def code_version():
+    """Hash of the enhancement sources, read without importing them."""
+    digest = hashlib.blake2b(digest_size=8)
+    for name in CODE_MODULES:
+        spec = importlib.util.find_spec(name)
+        if spec is not None and spec.origin and os.path.isfile(spec.origin):
+            with open(spec.origin, "rb") as f:
+                digest.update(f.read())
+    return digest.hexdigest()
+
+
+def file_digest(path):
+    """Content hash of a file, cheaper than decoding it."""
+    digest = hashlib.blake2b(digest_size=16)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(_HASH_CHUNK), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+class ResultCache:
+    def __init__(self, directory=DEFAULT_CACHE_DIR, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.writes = 0
+        self.evictions = 0
+        self._written = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def key(self, input_hash, enhancer, params=None, **variant):
+        """Cache key of one result; ``variant`` covers anything else that changes it, such as the format."""
+        description = json.dumps([input_hash, enhancer, params or {}, variant, code_version()],
+                                 sort_keys=True, default=repr)
+        return hashlib.blake2b(description.encode(), digest_size=20).hexdigest()
+
+    def _path(self, key, suffix):
+        return os.path.join(self.directory, key[:2], key + suffix)
+
+    def counters(self):
+        return {"hits": self.hits, "misses": self.misses, "writes": self.writes, "evictions": self.evictions}
+
+    def _count(self, hit):
+        with self._lock:
+            if hit:
+                self.hits += 1
+            else:
+                self.misses += 1
+
+    def _lookup(self, key, suffix):
+        # Touching the entry marks it as recently used; a concurrent eviction makes this a miss.
+        # Callers count the hit only once the entry has actually been read
+        path = self._path(key, suffix)
+        try:
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return path
+
+    def get_file(self, key, suffix, destination):
+        """Copy a cached encoded output to ``destination``; False on a miss or a failed copy."""
+        path = self._lookup(key, suffix)
+        try:
+            if path is not None:
+                shutil.copyfile(path, destination)
+        except FileNotFoundError:
+            path = None
+        self._count(path is not None)
+        return path is not None
+
+    def get_array(self, key):
+        path = self._lookup(key, ".npy")
+        array = None
+        try:
+            if path is not None:
+                array = np.load(path)
+        except (FileNotFoundError, ValueError):
+            pass
+        self._count(array is not None)
+        return array
+
+    def put_file(self, key, suffix, source):
+        """Store a copy of an encoded output."""
+        with open(source, "rb") as src:
+            self._store(key, suffix, lambda f: shutil.copyfileobj(src, f))
+
+    def put_array(self, key, array):
+        self._store(key, ".npy", lambda f: np.save(f, np.ascontiguousarray(array)))
+
+    def _store(self, key, suffix, write):
+        path = self._path(key, suffix)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                write(f)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except FileNotFoundError:
+                pass
+            raise
+        size = os.path.getsize(path)
+        with self._lock:
+            self.writes += 1
+            self._written += size
+            check = self._written * _EVICT_FRACTION > self.max_bytes
+        if check:
+            self.evict()
+
+    def entries(self):
+        """(mtime, size, path) of every complete entry."""
+        entries = []
+        for shard in os.scandir(self.directory):
+            if not shard.is_dir():
+                continue
+            for entry in os.scandir(shard.path):
+                if entry.name.endswith(".tmp"):
+                    continue
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return entries
+
+    def size(self):
+        return sum(size for _, size, _ in self.entries())
+
+    def evict(self):
+        """Delete least recently used entries until the cache fits in ``max_bytes``."""
+        with self._lock:
+            self._written = 0
+        entries = sorted(self.entries())
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if total <= self.max_bytes:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass  # Another process evicted it first
+            else:
+                with self._lock:
+                    self.evictions += 1
+            total -= size
+        return total
+
+    def clear(self):
+        for _, _, path in self.entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+
+def format_counters(counters):
+    lookups = counters["hits"] + counters["misses"]
+    rate = counters["hits"] / lookups if lookups else 0.0
+    return (f"cache: {counters['hits']} hits, {counters['misses']} misses ({rate:.0%} hit rate), "
+            f"{counters['writes']} writes, {counters['evictions']} evictions")
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Inspect or trim the enhancement result cache.")
+    parser.add_argument("--dir", default=DEFAULT_CACHE_DIR, help=f"Cache directory (default: {DEFAULT_CACHE_DIR})")
+    parser.add_argument("--max-mb", type=float, default=DEFAULT_MAX_BYTES / 2**20,
+                        help="Evict down to this size (default: 1024)")
+    parser.add_argument("--clear", action="store_true", help="Delete every entry")
+    args = parser.parse_args(argv)
+
+    cache = ResultCache(args.dir, int(args.max_mb * 2**20))
+    if args.clear:
+        cache.clear()
+    else:
+        cache.evict()
+    entries = cache.entries()
+    print(f"{args.dir}: {len(entries)} entries, {sum(size for _, size, _ in entries) / 2**20:.1f} MB "
+          f"(limit {args.max_mb:g} MB, code version {code_version()})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""CLAHE with user parameters, cached instances and band-parallel execution.
+
+CLAHE objects are cached per (clip limit, tile grid) in thread-local storage,
+since OpenCV algorithm objects are not safe to share between threads.
+
+Very large images can be split into horizontal bands made of whole CLAHE tile
+rows, plus one tile row of overlap on each side so the bilinear blend between
+neighbouring tiles sees the same tiles as a single call would. Each tile's
+lookup table only depends on its own pixels, so the bands reproduce the
+single-call result. OpenCV computes the blend weights in float32 from the row
+index, which is only exact under the band offset when the tile height is a
+power of two; banding is therefore used only in that case unless
+``exact=False`` is passed.
+
+OpenCV is imported on first use, so importing this module stays cheap.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+DEFAULT_CLIP_LIMIT = 3.5
+DEFAULT_TILE_GRID_SIZE = (10, 10)
+
+# Images below this size are always processed with a single CLAHE call
+PARALLEL_MIN_PIXELS = 16 * 1024 * 1024
+
+_local = threading.local()
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_clahe(clip_limit=DEFAULT_CLIP_LIMIT, tile_grid_size=DEFAULT_TILE_GRID_SIZE):
+    """Return this thread's cached CLAHE object for the given parameters."""
+    import cv2
+
+    cache = getattr(_local, "clahe", None)
+    if cache is None:
+        cache = _local.clahe = {}
+    key = (float(clip_limit), tuple(int(n) for n in tile_grid_size))
+    clahe = cache.get(key)
+    if clahe is None:
+        clahe = cache[key] = cv2.createCLAHE(clipLimit=key[0], tileGridSize=key[1])
+    return clahe
+
+
+def parse_tile_grid_size(text):
+    """Parse a tile grid such as "(8, 8)", "8,8" or "8x8" into a tuple of two ints."""
+    parts = text.strip().strip("()").replace("x", ",").split(",")
+    if len(parts) != 2:
+        raise ValueError(f"Invalid tile grid size: {text}")
+    grid = tuple(int(part) for part in parts)
+    if min(grid) < 1:
+        raise ValueError(f"Invalid tile grid size: {text}")
+    return grid
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=os.cpu_count() or 1, thread_name_prefix="clahe")
+        return _executor
+
+
+def _padding(shape, tile_grid_size):
+    # OpenCV pads both axes with BORDER_REFLECT_101 unless both divide evenly
+    height, width = shape
+    tiles_x, tiles_y = tile_grid_size
+    if width % tiles_x == 0 and height % tiles_y == 0:
+        return 0, 0
+    return tiles_y - height % tiles_y, tiles_x - width % tiles_x
+
+
+def band_exact(shape, tile_grid_size):
+    """True when banding reproduces the single-call result bit for bit."""
+    pad_bottom, _ = _padding(shape, tile_grid_size)
+    tile_height = (shape[0] + pad_bottom) // tile_grid_size[1]
+    return tile_height & (tile_height - 1) == 0
+
+
+def _apply_band(image_array, out, clip_limit, tile_grid_size, tile_height, first, last, pad_right):
+    # Enhance tile rows [first, last) using one tile row of context on each side
+    import cv2
+
+    height = image_array.shape[0]
+    tiles_x, tiles_y = tile_grid_size
+    context_first, context_last = max(first - 1, 0), min(last + 1, tiles_y)
+    top = context_first * tile_height
+    band = image_array[top:min(context_last * tile_height, height)]
+    pad_bottom = top + (context_last - context_first) * tile_height - (top + band.shape[0])
+    if pad_bottom or pad_right:
+        band = cv2.copyMakeBorder(band, 0, pad_bottom, 0, pad_right, cv2.BORDER_REFLECT_101)
+    enhanced = get_clahe(clip_limit, (tiles_x, context_last - context_first)).apply(band)
+    start, stop = first * tile_height, min(last * tile_height, height)
+    out[start:stop] = enhanced[start - top:stop - top, :image_array.shape[1]]
+
+
+def apply_clahe(image_array, clip_limit=DEFAULT_CLIP_LIMIT, tile_grid_size=DEFAULT_TILE_GRID_SIZE,
+                workers=None, exact=True):
+    """Apply CLAHE to a 2-D uint8 image, splitting very large images into parallel bands."""
+    tile_grid_size = tuple(int(n) for n in tile_grid_size)
+    workers = workers or os.cpu_count() or 1
+    tiles_x, tiles_y = tile_grid_size
+    if (workers < 2 or tiles_y < 2 or image_array.size < PARALLEL_MIN_PIXELS
+            or (exact and not band_exact(image_array.shape, tile_grid_size))):
+        return get_clahe(clip_limit, tile_grid_size).apply(image_array)
+
+    pad_bottom, pad_right = _padding(image_array.shape, tile_grid_size)
+    tile_height = (image_array.shape[0] + pad_bottom) // tiles_y
+    rows_per_band = -(-tiles_y // workers)
+    out = np.empty_like(image_array)
+    futures = [
+        _get_executor().submit(_apply_band, image_array, out, clip_limit, tile_grid_size, tile_height,
+                               first, min(first + rows_per_band, tiles_y), pad_right)
+        for first in range(0, tiles_y, rows_per_band)
+    ]
+    for future in futures:
+        future.result()
+    return out
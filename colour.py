@@ -0,0 +1,75 @@
+"""Colour enhancement on the luma plane only.
+
+``load_image(path, colour=True)`` keeps colour images as (height, width, 3)
+RGB arrays; gray files still decode to one plane and never reach this module.
+A colour image is converted to YCrCb once and the 2-D enhancer runs on its Y
+plane alone, so every NEW.py enhancer works unchanged and costs what it does
+on a grayscale image. The enhanced luma is written back into the YCrCb
+buffer, which is then converted back to RGB in place: besides the output,
+the only allocations are the single luma plane handed to the enhancer and
+the plane it returns.
+
+Usage:
+    python colour.py IMAGE OUTPUT [--enhancer pdf]
+"""
+import argparse
+import time
+
+import numpy as np
+
+
+def split_luma(image_array):
+    """(contiguous Y plane, YCrCb buffer) of an RGB image, in one conversion pass."""
+    import cv2
+
+    ycrcb = cv2.cvtColor(image_array, cv2.COLOR_RGB2YCrCb)
+    return np.ascontiguousarray(ycrcb[:, :, 0]), ycrcb
+
+
+def merge_luma(luma, ycrcb, out=None):
+    """RGB image from an enhanced Y plane and the chroma of ``ycrcb``.
+
+    With ``out=ycrcb`` the buffer is recombined and converted in place; by
+    default a new output is made, so ``ycrcb`` can serve several enhancements.
+    """
+    import cv2
+
+    if out is None:
+        out = ycrcb.copy()
+    elif out is not ycrcb:
+        out[:, :, 1:] = ycrcb[:, :, 1:]
+    out[:, :, 0] = luma
+    return cv2.cvtColor(out, cv2.COLOR_YCrCb2RGB, dst=out)
+
+
+def enhance_luma(image_array, enhance):
+    """Apply a 2-D enhancer to the luma of an RGB image; gray images are enhanced as they are."""
+    if image_array.ndim == 2:
+        return enhance(image_array)
+    luma, ycrcb = split_luma(image_array)
+    return merge_luma(enhance(luma), ycrcb, out=ycrcb)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Enhance a colour image on its luma plane.")
+    parser.add_argument("input", help="Input image")
+    parser.add_argument("output", help="Output image")
+    parser.add_argument("--enhancer", default="pdf", help="Registered enhancer (default: pdf)")
+    args = parser.parse_args(argv)
+
+    from NEW import load_image, save_enhanced_image
+    from registry import get_enhancer
+
+    image_array = load_image(args.input, colour=True)
+    enhance = get_enhancer(args.enhancer).bind()
+    start = time.perf_counter()
+    enhanced = enhance(image_array)
+    elapsed = time.perf_counter() - start
+    save_enhanced_image(enhanced, args.output)
+    kind = "colour" if image_array.ndim == 3 else "gray"
+    print(f"{args.enhancer} on {image_array.shape[1]}x{image_array.shape[0]} {kind} in {elapsed * 1000:.1f} ms "
+          f"-> {args.output}")
+
+
+if __name__ == "__main__":
+    main()
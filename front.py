@@ -2,14 +2,31 @@ import tkinter as tk
 from tkinter import filedialog, Label, messagebox, ttk, Frame, Scale
 from PIL import Image, ImageTk
 import os
+import queue
+import threading
+import time
 
 # Import backend functions
-from NEW import (
-    load_image, compute_histogram, compute_pdf, compute_mean_and_average_pdf,
-    compute_adaptive_pdf, modify_image_with_pdf, compute_cdf, compute_mean_and_average_cdf,
-    compute_adaptive_cdf, modify_image_with_cdf, contrast_adjustment, gamma_correction,
-    multi_scale_enhancement
-)
+from NEW import load_image
+from cache import ResultCache, file_digest
+from registry import iter_enhancers, get_enhancer
+from stats import ImageStats
+from viewer import TilePyramid, TileRenderer, TileCache, Viewport, render_view
+from jobs import BackgroundJobs, Debouncer
+from profiling import PROFILER
+
+# Display area for each image, reduced width for side-by-side display
+DISPLAY_WIDTH = 500
+DISPLAY_HEIGHT = 600
+
+# Pause in slider movement before the live preview is re-rendered
+PREVIEW_DELAY_MS = 30
+
+# How often the status bar picks up backend stage timings
+STAGE_POLL_MS = 100
+
+# Zoom factor of one mouse wheel step
+ZOOM_STEP = 1.25
 
 def create_placeholder_icon(frame, size=200):
     """Create a placeholder icon when no image is loaded"""
@@ -43,209 +60,378 @@ def button_press(button):
     button.state(['pressed'])
     root.after(100, lambda: button.state(['!pressed']))
 
+def set_status(text):
+    global status_text
+    status_text = text
+    status_bar.config(text=text)
+
+def stage_breakdown(since):
+    """Summarise the slowest background stages recorded after ``since``"""
+    main_thread = threading.main_thread().ident
+    records = [record for record in PROFILER.records_since(since) if record.tid != main_thread]
+    rows = PROFILER.summary(records)[:3]
+    return ", ".join(f"{row['name']} {row['wall_s'] * 1000:.0f} ms" for row in rows)
+
+def show_stage_progress():
+    """Append the latest finished background stage to the status bar while jobs run"""
+    latest = None
+    while not stage_records.empty():
+        record = stage_records.get()
+        if record.tid != threading.main_thread().ident:
+            latest = record
+    if latest is not None and (jobs.busy("enhance") or jobs.busy("open_full")):
+        status_bar.config(text=f"{status_text} | {latest.name} {latest.wall_ns / 1e6:.0f} ms")
+    root.after(STAGE_POLL_MS, show_stage_progress)
+
+def show_job_error(error):
+    set_status("Error")
+    messagebox.showerror("Error", str(error))
+
+def fit_to_display(image):
+    """Resize an image to fit the display area, keeping images that already fit as they are"""
+    width, height = image.size
+    ratio = min(DISPLAY_WIDTH/width, DISPLAY_HEIGHT/height)
+    new_size = (max(1, int(width*ratio)), max(1, int(height*ratio)))
+    if new_size == image.size:
+        return image
+    return image.resize(new_size, Image.Resampling.LANCZOS)
+
 def open_image():
-    global img_array, original_image
+    global img_array, proxy_array, original_image, img_hash
+    global img_stats, pyramid, viewport, original_renderer, enhanced_renderer
 
     file_path = filedialog.askopenfilename(filetypes=[("Image Files", "*.jpg *.png *.jpeg *.bmp")])
     if not file_path:
         return
 
-    img_array = load_image(file_path)
+    jobs.cancel("enhance")
+    img_array = proxy_array = original_image = img_hash = None
+    img_stats = pyramid = viewport = original_renderer = enhanced_renderer = None
+    set_status(f"Loading {os.path.basename(file_path)}...")
+
+    # The display proxy comes from a reduced-size decode, so it shows up long before the full image
+    jobs.submit("open", load_image, file_path, (DISPLAY_WIDTH, DISPLAY_HEIGHT),
+                on_done=lambda image_array, seconds: proxy_loaded(image_array), on_error=show_job_error)
+    jobs.submit("open_full", load_for_editing, file_path,
+                on_done=lambda result, seconds: image_loaded(file_path, result, seconds),
+                on_error=show_job_error)
+
+def proxy_loaded(image_array):
+    global proxy_array
+
+    proxy_array = image_array
+    display_original_image(Image.fromarray(proxy_array))
+
+def load_for_editing(file_path):
+    """Decode the full image, hash the file it came from (which keys the result cache), build the
+    zoom pyramid and take the whole-image histogram that tiles are enhanced from"""
+    image_array = load_image(file_path)
+    return image_array, file_digest(file_path), TilePyramid(image_array).build(), ImageStats.from_image(image_array)
+
+def image_loaded(file_path, result, seconds):
+    global img_array, img_hash, original_image, img_stats, pyramid, viewport, original_renderer
+
+    img_array, img_hash, pyramid, img_stats = result
     original_image = Image.fromarray(img_array)
-    display_original_image(original_image)
+    viewport = Viewport(pyramid.size, (DISPLAY_WIDTH, DISPLAY_HEIGHT))
+    original_renderer = TileRenderer(pyramid)
+    draw_views()
+    height, width = img_array.shape[:2]
+    set_status(f"Loaded {os.path.basename(file_path)} ({width}x{height}) in {seconds:.2f} s "
+               f"- scroll to zoom, drag to pan, double-click to fit")
+
+def draw_views():
+    """Render the visible part of both images at the current zoom and position"""
+    if viewport is None:
+        return
+
+    zoom = f"{viewport.zoom:.0%}"
+    display_original_image(Image.fromarray(render_view(original_renderer, viewport)), f"Original Image ({zoom})",
+                           fit=False)
+    if enhanced_renderer is not None:
+        display_enhanced_image(Image.fromarray(render_view(enhanced_renderer, viewport)),
+                               f"{enhanced_title} ({zoom})", fit=False)
+
+def show_enhanced_tiles(renderer, title):
+    """Show an enhancement in the zoomable view; returns the milliseconds the visible tiles took"""
+    global enhanced_renderer, enhanced_title
+
+    start = time.perf_counter()
+    enhanced_renderer, enhanced_title = renderer, title
+    display_enhanced_image(Image.fromarray(render_view(renderer, viewport)), f"{title} ({viewport.zoom:.0%})",
+                           fit=False)
+    return (time.perf_counter() - start) * 1000
+
+def display_proxy_preview(image, title):
+    """Whole-frame preview from the display proxy; the zoomable view returns with the full-resolution result"""
+    global enhanced_renderer
+    enhanced_renderer = None
+    display_enhanced_image(image, title)
+
+def enhancer_table(enhancer, params):
+    """Lookup table of a point enhancer from whole-image statistics, so every tile agrees with
+    the full-resolution result; None when the enhancer needs the pixels around each tile"""
+    if img_stats is None:
+        return None
+    return enhancer.build_table(img_stats.histogram, **params)
+
+def zoom_view(event):
+    if viewport is None:
+        return
+
+    # X11 reports wheel steps as buttons 4 and 5, other platforms as a signed delta
+    zoom_in = event.num == 4 or event.delta > 0
+    viewport.zoom_at(ZOOM_STEP if zoom_in else 1 / ZOOM_STEP, *viewport.to_image(*view_position(event)))
+    draw_views()
+
+def view_position(event):
+    """Position of a mouse event within the rendered view, which the label shows centred"""
+    label = event.widget
+    photo = getattr(label, "image", None)
+    if photo is None:
+        return event.x, event.y
+    return (event.x - (label.winfo_width() - photo.width()) / 2,
+            event.y - (label.winfo_height() - photo.height()) / 2)
+
+def start_pan(event):
+    global pan_anchor
+    pan_anchor = (event.x, event.y)
+
+def pan_view(event):
+    global pan_anchor
+    if viewport is None or pan_anchor is None:
+        return
+
+    viewport.pan(event.x - pan_anchor[0], event.y - pan_anchor[1])
+    pan_anchor = (event.x, event.y)
+    draw_views()
 
-def display_original_image(image):
+def fit_view(event):
+    if viewport is not None:
+        viewport.fit()
+        draw_views()
+
+def display_original_image(image, title="Original Image", fit=True):
     global original_img_display
     
     # Clear any existing placeholder
     for widget in original_img_label.winfo_children():
         widget.destroy()
     
-    # Resize image to fit display area while maintaining aspect ratio
-    display_width = 500  # Reduced width for side-by-side display
-    display_height = 600
-    
-    width, height = image.size
-    ratio = min(display_width/width, display_height/height)
-    new_size = (int(width*ratio), int(height*ratio))
-    
-    resized_image = image.resize(new_size, Image.Resampling.LANCZOS)
+    # Resize image to fit display area while maintaining aspect ratio; rendered views are
+    # already at their zoom and are shown as they are
+    resized_image = fit_to_display(image) if fit else image
     original_img_display = ImageTk.PhotoImage(image=resized_image)
     original_img_label.config(image=original_img_display)
     original_img_label.image = original_img_display
-    original_img_label_title.config(text="Original Image")
+    original_img_label_title.config(text=title)
 
-def display_enhanced_image(image, title):
+def display_enhanced_image(image, title, fit=True):
     global enhanced_img_display
     
     # Clear any existing placeholder
     for widget in enhanced_img_label.winfo_children():
         widget.destroy()
     
-    # Resize image to fit display area while maintaining aspect ratio
-    display_width = 500  # Reduced width for side-by-side display
-    display_height = 600
-    
-    width, height = image.size
-    ratio = min(display_width/width, display_height/height)
-    new_size = (int(width*ratio), int(height*ratio))
-    
-    resized_image = image.resize(new_size, Image.Resampling.LANCZOS)
+    # Resize image to fit display area while maintaining aspect ratio; rendered views are
+    # already at their zoom and are shown as they are
+    resized_image = fit_to_display(image) if fit else image
     enhanced_img_display = ImageTk.PhotoImage(image=resized_image)
     enhanced_img_label.config(image=enhanced_img_display)
     enhanced_img_label.image = enhanced_img_display
     enhanced_img_label_title.config(text=title)
 
+def ask_save_path():
+    return filedialog.asksaveasfilename(defaultextension=".jpg", 
+                                        filetypes=[("JPEG", "*.jpg"), ("PNG", "*.png")])
+
 def save_image(image, prompt):
-    file_path = filedialog.asksaveasfilename(defaultextension=".jpg", 
-                                           filetypes=[("JPEG", "*.jpg"), ("PNG", "*.png")])
+    file_path = ask_save_path()
     if file_path:
         image.save(file_path)
         messagebox.showinfo("Success", f"{prompt} saved to: {file_path}")
 
-def enhance_pdf():
-    if img_array is None:
-        messagebox.showerror("Error", "Please load an image first.")
+def save_full_resolution(title, enhance, image_array, cache_key=None):
+    """Tile views never enhance the whole frame; do it now, in the background, for the saved file"""
+    file_path = ask_save_path()
+    if not file_path:
         return
 
-    histogram = compute_histogram(img_array)
-    pdf = compute_pdf(histogram)
-    mean_pdf, average_pdf = compute_mean_and_average_pdf(pdf)
-    adaptive_pdf = compute_adaptive_pdf(pdf, mean_pdf, average_pdf)
-    enhanced_image = modify_image_with_pdf(img_array, adaptive_pdf)
-
-    pdf_enhanced_image = Image.fromarray(enhanced_image)
-    display_enhanced_image(pdf_enhanced_image, "PDF Enhanced Image")
-    save_button.config(command=lambda: save_image(pdf_enhanced_image, "PDF Enhanced Image"))
+    set_status(f"{title}: rendering full resolution to save...")
+
+    def on_done(cached, seconds):
+        source = "from cache" if cached else "rendered"
+        set_status(f"{title}: full resolution {source} and saved in {seconds:.2f} s")
+        messagebox.showinfo("Success", f"{title} saved to: {file_path}")
+
+    jobs.submit("save", write_full_resolution, enhance, image_array, cache_key, file_path,
+                on_done=on_done, on_error=show_job_error)
+
+def write_full_resolution(enhance, image_array, cache_key, file_path):
+    enhanced_array, cached = enhance_full_resolution(enhance, image_array, cache_key)
+    Image.fromarray(enhanced_array).save(file_path)
+    return cached
+
+def enhance_full_resolution(enhance, image_array, cache_key=None):
+    """Enhance the full-resolution image, or fetch it from the result cache (runs in the background)"""
+    enhanced_array = result_cache.get_array(cache_key) if cache_key else None
+    cached = enhanced_array is not None
+    if not cached:
+        enhanced_array = enhance(image_array)
+        if cache_key:
+            result_cache.put_array(cache_key, enhanced_array)
+    return enhanced_array, cached
+
+def render_full_resolution(enhance, image_array, cache_key=None):
+    """Enhance the full-resolution image and build its zoom pyramid (runs in the background)"""
+    enhanced_array, cached = enhance_full_resolution(enhance, image_array, cache_key)
+    return Image.fromarray(enhanced_array), TilePyramid(enhanced_array).build(), cached
+
+def run_enhancement(title, enhance, settings=None):
+    """Point enhancers only enhance the visible tiles; others show an instant preview on the display
+    proxy, then render full resolution in the background. ``settings`` is an (enhancer name,
+    parameters) pair; when given, full-resolution results are cached"""
+    if img_array is None or proxy_array is None:
+        message = "The image is still loading." if jobs.busy("open_full") else "Please load an image first."
+        messagebox.showerror("Error", message)
+        return
 
-def enhance_cdf():
-    if img_array is None:
-        messagebox.showerror("Error", "Please load an image first.")
+    cache_key = result_cache.key(img_hash, *settings) if settings is not None else None
+    table = enhancer_table(get_enhancer(settings[0]), settings[1]) if settings is not None else None
+    if table is not None:
+        jobs.cancel("enhance")
+        tiles_ms = show_enhanced_tiles(TileRenderer(pyramid, table, tile_cache), title)
+        save_button.config(command=lambda image_array=img_array: save_full_resolution(title, enhance, image_array,
+                                                                                       cache_key))
+        save_button.state(['!disabled'])
+        set_status(f"{title}: visible tiles in {tiles_ms:.0f} ms; full resolution is rendered when saved")
         return
 
-    histogram = compute_histogram(img_array)
-    cdf = compute_cdf(histogram)
-    mean_cdf, average_cdf = compute_mean_and_average_cdf(cdf)
-    adaptive_cdf = compute_adaptive_cdf(cdf, mean_cdf, average_cdf)
-    enhanced_image = modify_image_with_cdf(img_array, adaptive_cdf)
-
-    cdf_enhanced_image = Image.fromarray(enhanced_image)
-    display_enhanced_image(cdf_enhanced_image, "CDF Enhanced Image")
-    save_button.config(command=lambda: save_image(cdf_enhanced_image, "CDF Enhanced Image"))
-
-def show_contrast_controls():
-    contrast_window = tk.Toplevel(root)
-    contrast_window.title("Contrast Controls")
-    contrast_window.geometry("300x300")
-    contrast_window.configure(bg='#2C3E50')
-    
-    # Alpha Slider (Contrast)
-    Label(contrast_window, text="Contrast (Alpha)", bg='#2C3E50', fg='#ECF0F1').pack(pady=10)
-    alpha_slider = Scale(contrast_window, from_=0.1, to=5.0, resolution=0.1, orient='horizontal',
-                        bg='#2C3E50', fg='#ECF0F1')
-    alpha_slider.set(2.5)
-    alpha_slider.pack(fill='x', padx=20)
-    
-    # Beta Slider (Brightness)
-    Label(contrast_window, text="Brightness (Beta)", bg='#2C3E50', fg='#ECF0F1').pack(pady=10)
-    beta_slider = Scale(contrast_window, from_=0.1, to=3.0, resolution=0.1, orient='horizontal',
-                       bg='#2C3E50', fg='#ECF0F1')
-    beta_slider.set(1.5)
-    beta_slider.pack(fill='x', padx=20)
-    
-    def apply_contrast():
-        if img_array is None:
-            messagebox.showerror("Error", "Please load an image first.")
-            return
+    start = time.perf_counter()
+    display_proxy_preview(Image.fromarray(enhance(proxy_array)), f"{title} (preview)")
+    preview_ms = (time.perf_counter() - start) * 1000
+    save_button.state(['disabled'])
+    set_status(f"{title}: preview in {preview_ms:.0f} ms, rendering full resolution...")
+    mark = PROFILER.mark()
+
+    def on_done(result, seconds):
+        enhanced_image, enhanced_pyramid, cached = result
+        show_enhanced_tiles(TileRenderer(enhanced_pyramid), title)
+        save_button.config(command=lambda: save_image(enhanced_image, title))
+        save_button.state(['!disabled'])
+        if cached:
+            set_status(f"{title}: preview in {preview_ms:.0f} ms, full resolution from cache in {seconds:.2f} s")
+        else:
+            set_status(f"{title}: preview in {preview_ms:.0f} ms, full resolution in {seconds:.2f} s "
+                       f"({stage_breakdown(mark)})")
+
+    jobs.submit("enhance", render_full_resolution, enhance, img_array, cache_key,
+                on_done=on_done, on_error=show_job_error)
+
+def preview_enhancement(enhancer, params):
+    """Re-render the live preview: the visible tiles for point enhancers, the display proxy for others"""
+    # Save stays off until Apply renders what the preview shows, and a full-resolution render
+    # still in flight must not replace the preview when it finishes
+    jobs.cancel("enhance")
+    save_button.state(['disabled'])
+    table = enhancer_table(enhancer, params)
+    if table is not None:
+        tiles_ms = show_enhanced_tiles(TileRenderer(pyramid, table, tile_cache), f"{enhancer.title} (preview)")
+        set_status(f"{enhancer.title}: live preview of the visible tiles in {tiles_ms:.1f} ms")
+        return
+    if proxy_array is None:
+        return
 
-        alpha = alpha_slider.get()
-        beta = beta_slider.get()
-        enhanced_image = contrast_adjustment(img_array, alpha=alpha, beta=beta)
-        contrast_enhanced_image = Image.fromarray(enhanced_image)
-        display_enhanced_image(contrast_enhanced_image, "Contrast Adjusted Image")
-        save_button.config(command=lambda: save_image(contrast_enhanced_image, "Contrast Enhanced Image"))
-        contrast_window.destroy()
-    
-    button_frame = Frame(contrast_window, bg='#2C3E50')
-    button_frame.pack(side='bottom', fill='x', pady=20)
-    
-    apply_btn = ttk.Button(button_frame, text="Apply", command=apply_contrast, style='Modern.TButton')
-    apply_btn.pack(pady=10, padx=20, fill='x')
+    start = time.perf_counter()
+    display_proxy_preview(Image.fromarray(enhancer.bind(**params)(proxy_array)), f"{enhancer.title} (preview)")
+    set_status(f"{enhancer.title}: live preview in {(time.perf_counter() - start) * 1000:.1f} ms")
+
+def attach_live_preview(window, enhancer, make_params):
+    """Return a trigger that previews the enhancer with ``make_params()`` once the controls settle"""
+    preview = Debouncer(root, PREVIEW_DELAY_MS, lambda: preview_enhancement(enhancer, make_params()))
+    window.bind('<Destroy>', lambda event: preview.cancel())
+    return preview.trigger
+
+def start_enhancement(enhancer):
+    """Run an enhancer straight away, or open its settings window when it has parameters"""
+    if enhancer.params:
+        show_enhancer_controls(enhancer)
+    else:
+        run_enhancement(enhancer.title, enhancer.bind(), (enhancer.name, {}))
+
+def show_enhancer_controls(enhancer):
+    """Settings window built from the enhancer's declared parameters"""
+    settings_window = tk.Toplevel(root)
+    settings_window.title(f"{enhancer.label} Settings")
+    settings_window.geometry(f"300x{110 + 90 * len(enhancer.params)}")
+    settings_window.configure(bg='#2C3E50')
 
-def show_gamma_controls():
-    gamma_window = tk.Toplevel(root)
-    gamma_window.title("Gamma Controls")
-    gamma_window.geometry("300x200")  # Increased height to ensure button visibility
-    gamma_window.configure(bg='#2C3E50')
-    
-    # Gamma Slider
-    Label(gamma_window, text="Gamma", bg='#2C3E50', fg='#ECF0F1').pack(pady=10)
-    gamma_slider = Scale(gamma_window, from_=0.1, to=5.0, resolution=0.1, orient='horizontal',
-                        bg='#2C3E50', fg='#ECF0F1')
-    gamma_slider.set(2.2)
-    gamma_slider.pack(fill='x', padx=20)
-    
-    def apply_gamma_correction():
+    # A slider for each numeric range, a dropdown for each list of choices
+    widgets = {}
+    for param in enhancer.params:
+        Label(settings_window, text=param.label, bg='#2C3E50', fg='#ECF0F1').pack(pady=10)
+        if param.choices:
+            variable = tk.StringVar(value=param.default)
+            dropdown = ttk.Combobox(settings_window, textvariable=variable, values=param.choices)
+            dropdown.pack(pady=5)
+            widgets[param.name] = (param, variable, dropdown)
+        else:
+            slider = Scale(settings_window, from_=param.minimum, to=param.maximum, resolution=param.step,
+                           orient='horizontal', bg='#2C3E50', fg='#ECF0F1')
+            slider.set(param.default)
+            slider.pack(fill='x', padx=20)
+            widgets[param.name] = (param, slider, slider)
+
+    def current_params():
+        return {name: param.parse(source.get()) for name, (param, source, _) in widgets.items()}
+
+    # Live preview while the controls change
+    update_preview = attach_live_preview(settings_window, enhancer, current_params)
+    for param, _, widget in widgets.values():
+        if param.choices:
+            widget.bind('<<ComboboxSelected>>', update_preview)
+        else:
+            widget.config(command=update_preview)
+
+    def apply_settings():
         if img_array is None:
             messagebox.showerror("Error", "Please load an image first.")
             return
 
-        gamma = gamma_slider.get()
-        enhanced_image = gamma_correction(img_array, gamma=gamma)
-        gamma_corrected_image = Image.fromarray(enhanced_image)
-        display_enhanced_image(gamma_corrected_image, "Gamma Corrected Image")
-        save_button.config(command=lambda: save_image(gamma_corrected_image, "Gamma Corrected Image"))
-        gamma_window.destroy()
-    
-    # Container frame for button to ensure visibility
-    button_frame = Frame(gamma_window, bg='#2C3E50')
-    button_frame.pack(side='bottom', fill='x', pady=20)
-    
-    apply_btn = ttk.Button(button_frame, text="Apply", command=apply_gamma_correction, style='Modern.TButton')
-    apply_btn.pack(pady=10, padx=20, fill='x')
-
-def multi_scale():
-    if img_array is None:
-        messagebox.showerror("Error", "Please load an image first.")
-        return
-
-    # Create settings window
-    settings_window = tk.Toplevel(root)
-    settings_window.title("Multi-Scale Settings")
-    settings_window.geometry("300x250")
-    settings_window.configure(bg='#2C3E50')
+        try:
+            params = current_params()
+        except ValueError as e:
+            messagebox.showerror("Error", f"Invalid {enhancer.label.lower()} settings: {e}")
+            return
 
-    # Clip Limit dropdown
-    Label(settings_window, text="Clip Limit", bg='#2C3E50', fg='#ECF0F1').pack(pady=10)
-    clip_limit_var = tk.StringVar(value="3.5")
-    clip_limit_options = ["1.0", "2.0", "3.0", "3.5", "4.0", "5.0"]
-    clip_limit_dropdown = ttk.Combobox(settings_window, textvariable=clip_limit_var, values=clip_limit_options)
-    clip_limit_dropdown.pack(pady=5)
-
-    # Tile Grid Size dropdown
-    Label(settings_window, text="Tile Grid Size", bg='#2C3E50', fg='#ECF0F1').pack(pady=10)
-    grid_size_var = tk.StringVar(value="(10, 10)")
-    grid_size_options = ["(2,2)","(8, 8)", "(10, 10)", "(12, 12)", "(14, 14)"]
-    grid_size_dropdown = ttk.Combobox(settings_window, textvariable=grid_size_var, values=grid_size_options)
-    grid_size_dropdown.pack(pady=5)
-
-    def apply_multi_scale():
-        clip_limit = float(clip_limit_var.get())
-        grid_size = eval(grid_size_var.get())
-        
-        enhanced_image = multi_scale_enhancement(img_array)
-        multi_scale_enhanced_image = Image.fromarray(enhanced_image)
-        display_enhanced_image(multi_scale_enhanced_image, "Multi-Scale Enhanced Image")
-        save_button.config(command=lambda: save_image(multi_scale_enhanced_image, "Multi-Scale Enhanced Image"))
+        run_enhancement(enhancer.title, enhancer.bind(**params), (enhancer.name, params))
         settings_window.destroy()
 
-    # Apply button
     button_frame = Frame(settings_window, bg='#2C3E50')
     button_frame.pack(side='bottom', fill='x', pady=20)
-    
-    apply_btn = ttk.Button(button_frame, text="Apply", command=apply_multi_scale, style='Modern.TButton')
+
+    def auto_settings():
+        if img_stats is None and proxy_array is None:
+            messagebox.showerror("Error", "Please load an image first.")
+            return
+
+        # Candidates are scored on the histogram alone; moving the sliders renders the winner's preview
+        start = time.perf_counter()
+        stats = img_stats if img_stats is not None else ImageStats.from_image(proxy_array)
+        for name, value in enhancer.tune(stats.histogram).items():
+            param, source_widget, _ = widgets[name]
+            source_widget.set(value if param.choices is None else str(value))
+        update_preview()
+        set_status(f"{enhancer.label}: parameters tuned in {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    apply_btn = ttk.Button(button_frame, text="Apply", command=apply_settings, style='Modern.TButton')
     apply_btn.pack(pady=10, padx=20, fill='x')
 
+    if enhancer.tuner is not None:
+        settings_window.geometry(f"300x{170 + 90 * len(enhancer.params)}")
+        auto_btn = ttk.Button(button_frame, text="Auto", command=auto_settings, style='Modern.TButton')
+        auto_btn.pack(pady=(0, 10), padx=20, fill='x')
+
 def update_image(*args):
     if img_array is not None:
         adjust_contrast()
@@ -257,7 +443,30 @@ root.geometry("1400x900")  # Wider window for side-by-side display
 root.configure(bg='#2C3E50')  # Dark blue-gray background
 
 img_array = None
+img_hash = None
+proxy_array = None
 original_image = None
+jobs = BackgroundJobs(root)
+
+# Zoomable views: pyramid of the loaded image, whole-image statistics for the tile tables,
+# the shared zoom and position of both views, and an LRU cache of enhanced tiles
+img_stats = None
+pyramid = None
+viewport = None
+original_renderer = None
+enhanced_renderer = None
+enhanced_title = ""
+pan_anchor = None
+tile_cache = TileCache()
+
+# Re-applying the same enhancement to the same file is served from the on-disk result cache
+result_cache = ResultCache()
+status_text = "Ready"
+
+# Backend stage timings feed the status bar; the profiler costs next to nothing per stage
+stage_records = queue.SimpleQueue()
+PROFILER.add_listener(stage_records.put)
+PROFILER.enable()
 
 # Create main container with horizontal layout
 main_container = Frame(root, bg='#2C3E50')
@@ -297,15 +506,10 @@ style.map('Modern.TButton',
 root.tk.call('tk', 'scaling', 1.0)  # Ensure consistent scaling
 root.tk.call('ttk::style', 'configure', 'Modern.TButton', '-corner-radius', 8)
 
-# Control buttons with hover effects and press animation
-buttons_data = [
-    ("Open Image", lambda b=None: [button_press(b), open_image()]),
-    ("PDF Enhancement", lambda b=None: [button_press(b), enhance_pdf()]),
-    ("CDF Enhancement", lambda b=None: [button_press(b), enhance_cdf()]),
-    ("Contrast Adjustment", lambda b=None: [button_press(b), show_contrast_controls()]),
-    ("Gamma Correction", lambda b=None: [button_press(b), show_gamma_controls()]),
-    ("Multi-Scale Enhancement", lambda b=None: [button_press(b), multi_scale()])
-]
+# Control buttons with hover effects and press animation, one per registered enhancer
+buttons_data = [("Open Image", lambda b=None: [button_press(b), open_image()])]
+buttons_data += [(enhancer.label, lambda b=None, e=enhancer: [button_press(b), start_enhancement(e)])
+                 for enhancer in iter_enhancers(available_only=True)]
 
 for text, command in buttons_data:
     btn = ttk.Button(button_frame, 
@@ -354,6 +558,15 @@ enhanced_img_label.pack(expand=True)
 # Add placeholder to enhanced image frame
 enhanced_placeholder = create_placeholder_icon(enhanced_img_label)
 
+# Both views zoom with the mouse wheel, pan by dragging and fit the image again on double-click
+for view_label in (original_img_label, enhanced_img_label):
+    view_label.bind('<MouseWheel>', zoom_view)
+    view_label.bind('<Button-4>', zoom_view)
+    view_label.bind('<Button-5>', zoom_view)
+    view_label.bind('<ButtonPress-1>', start_pan)
+    view_label.bind('<B1-Motion>', pan_view)
+    view_label.bind('<Double-Button-1>', fit_view)
+
 # Modern status bar
 status_bar = Label(root, 
                   text="Ready", 
@@ -365,4 +578,10 @@ status_bar = Label(root,
                   font=("Helvetica", 10))
 status_bar.pack(side='bottom', fill='x', pady=5)
 
+def on_close():
+    jobs.shutdown()
+    root.destroy()
+
+root.protocol("WM_DELETE_WINDOW", on_close)
+root.after(STAGE_POLL_MS, show_stage_progress)
 root.mainloop()
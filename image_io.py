@@ -0,0 +1,155 @@
+"""Image decode and encode helpers.
+
+Decoding can be bounded to a maximum size: JPEGs are then decoded with DCT
+scaling (1/2, 1/4 or 1/8 resolution) straight to grayscale through
+``Image.draft``, which skips both the full-size decode and the intermediate
+RGB buffer; other formats are reduced right after decoding. Encoding writes
+several outputs concurrently on a thread pool, since PIL releases the GIL
+while compressing.
+
+PIL is imported on first use, so importing this module stays cheap.
+"""
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+# Same as PIL's own JPEG default, so existing outputs are unchanged
+DEFAULT_QUALITY = 75
+
+# Format names by file extension for the formats we write
+OUTPUT_FORMATS = {
+    ".jpg": "JPEG",
+    ".jpeg": "JPEG",
+    ".png": "PNG",
+    ".webp": "WEBP",
+    ".tif": "TIFF",
+    ".tiff": "TIFF",
+    ".bmp": "BMP",
+}
+
+# Grayscale modes decoded to uint16 with keep_depth
+HIGH_BIT_MODES = ("I;16", "I;16B", "I;16L", "I;16N", "I")
+
+# Modes without colour; with colour=True they are still decoded to a single plane
+GRAY_MODES = ("1", "L", "LA", "F") + HIGH_BIT_MODES
+
+# Modes whose samples can be box-averaged by Image.reduce and resized before conversion;
+# palette indices, bilevel and 16-bit images are converted first
+REDUCIBLE_MODES = ("L", "LA", "RGB", "RGBA", "CMYK", "YCbCr", "I", "F")
+
+
+def decode_image(image_path, max_size=None, exact=True, keep_depth=False, colour=False):
+    """Decode an image to a grayscale uint8 array.
+
+    ``max_size`` is an optional (width, height) bound for previews; the result
+    fits inside it with its aspect ratio kept. With ``exact=False`` JPEGs are
+    decoded from their luma channel even at full size, which is faster than
+    converting through RGB but may differ by a level or two on a few pixels.
+    With ``keep_depth`` 16-bit grayscale images (TIFF, PNG) are returned as
+    uint16 instead of being reduced to 8 bits. With ``colour`` colour images
+    are returned as (height, width, 3) RGB arrays; gray images stay 2-D.
+    """
+    from PIL import Image
+
+    with Image.open(image_path) as image:
+        if keep_depth and image.mode in HIGH_BIT_MODES:
+            return _decode_high_bit(image, max_size)
+        mode = "RGB" if colour and image.mode not in GRAY_MODES else "L"
+        if image.format == "JPEG" and mode == "RGB" and max_size is not None:
+            image.draft("RGB", tuple(max_size))
+        elif image.format == "JPEG" and mode == "L" and image.mode != "L" and (max_size is not None or not exact):
+            image.draft("L", tuple(max_size) if max_size is not None else image.size)
+        if max_size is not None:
+            if image.mode not in REDUCIBLE_MODES:
+                image = image.convert(mode)
+            # Cheap integer box reduction first, then a high-quality resize of what is left
+            factor = min(image.size[0] // max_size[0], image.size[1] // max_size[1])
+            if factor >= 2:
+                image = image.reduce(factor)
+            image.thumbnail(tuple(max_size), Image.Resampling.LANCZOS)
+        if image.mode != mode:
+            image = image.convert(mode)
+        return np.array(image)
+
+
+def _decode_high_bit(image, max_size):
+    from PIL import Image
+
+    # PIL only resamples 32-bit integer images, so previews are resized in mode "I"
+    if max_size is not None:
+        image = image.convert("I")
+        image.thumbnail(tuple(max_size), Image.Resampling.LANCZOS)
+    image_array = np.array(image)
+    if image_array.dtype != np.uint16:
+        image_array = np.clip(image_array, 0, 65535).astype(np.uint16)
+    return image_array
+
+
+def encode_options(image_format, quality=DEFAULT_QUALITY):
+    """Keyword arguments for ``Image.save`` for each supported format."""
+    if image_format == "JPEG":
+        return {"quality": quality}
+    if image_format == "WEBP":
+        return {"quality": quality, "lossless": quality >= 100}
+    if image_format == "PNG":
+        return {"compress_level": 6}
+    if image_format == "TIFF":
+        return {"compression": "tiff_adobe_deflate"}
+    return {}
+
+
+def encode_image(image_array, output_path, image_format=None, quality=DEFAULT_QUALITY):
+    """Encode an array to ``output_path``; the format defaults to the file extension."""
+    from PIL import Image
+
+    if image_format is None:
+        # Unknown extensions are left to PIL with its default options
+        image_format = OUTPUT_FORMATS.get(os.path.splitext(output_path)[1].lower())
+    Image.fromarray(image_array).save(output_path, format=image_format, **encode_options(image_format, quality))
+    return output_path
+
+
+class ImageWriter:
+    """Encode outputs on a thread pool while the caller keeps computing.
+
+    Use as a context manager; leaving the block waits for every write and
+    re-raises the first error.
+    """
+
+    def __init__(self, workers=None, save=encode_image, **options):
+        self._executor = ThreadPoolExecutor(max_workers=workers or min(8, os.cpu_count() or 1),
+                                            thread_name_prefix="encode")
+        self._save = save
+        self._options = options
+        self._futures = []
+
+    def submit(self, image_array, output_path):
+        self._futures.append(self._executor.submit(self._save, image_array, output_path, **self._options))
+
+    def wait(self):
+        try:
+            return [future.result() for future in self._futures]
+        finally:
+            self._futures = []
+
+    def close(self):
+        try:
+            self.wait()
+        finally:
+            self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+        return False
+
+
+def save_images(items, workers=None, **options):
+    """Encode (image_array, output_path) pairs concurrently and return the paths."""
+    with ImageWriter(workers, **options) as writer:
+        for image_array, output_path in items:
+            writer.submit(image_array, output_path)
+        return writer.wait()
@@ -0,0 +1,116 @@
+"""Background job runner for the Tkinter front end.
+
+Work runs on a small thread pool (NumPy, PIL and OpenCV release the GIL for
+the heavy parts) and results are handed back on the Tk main thread by polling
+with ``root.after``. Jobs share a tag per kind of work; submitting a new job
+under a tag makes any older job under that tag outdated, so its result is
+dropped instead of overwriting newer output.
+"""
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+POLL_INTERVAL_MS = 30
+
+
+class BackgroundJobs:
+    def __init__(self, root, max_workers=2, poll_ms=POLL_INTERVAL_MS):
+        self.root = root
+        self.poll_ms = poll_ms
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="enhance")
+        self._generations = {}
+        self._pending = []
+        self._polling = False
+
+    def submit(self, tag, func, *args, on_done=None, on_error=None):
+        """Run ``func(*args)`` in the background, superseding older jobs with ``tag``.
+
+        ``on_done(result, seconds)`` and ``on_error(exception)`` are called on
+        the Tk main thread, and only if no newer job with ``tag`` was submitted.
+        """
+        self.cancel(tag)
+        generation = self._generations[tag]
+        future = self._executor.submit(self._timed, func, *args)
+        self._pending.append((tag, generation, future, on_done, on_error))
+        if not self._polling:
+            self._polling = True
+            self.root.after(self.poll_ms, self._poll)
+        return future
+
+    def cancel(self, tag):
+        """Mark every job with ``tag`` as outdated and drop those not started yet."""
+        self._generations[tag] = self._generations.get(tag, 0) + 1
+        for job_tag, _, future, _, _ in self._pending:
+            if job_tag == tag:
+                future.cancel()
+
+    def busy(self, tag):
+        return any(job_tag == tag and generation == self._generations[tag]
+                   for job_tag, generation, _, _, _ in self._pending)
+
+    def shutdown(self):
+        for tag in list(self._generations):
+            self.cancel(tag)
+        self._executor.shutdown(wait=False)
+
+    @staticmethod
+    def _timed(func, *args):
+        start = time.perf_counter()
+        result = func(*args)
+        return result, time.perf_counter() - start
+
+    def _poll(self):
+        still_pending = []
+        finished = []
+        for job in self._pending:
+            (finished if job[2].done() else still_pending).append(job)
+        self._pending = still_pending
+
+        try:
+            for tag, generation, future, on_done, on_error in finished:
+                if future.cancelled() or generation != self._generations[tag]:
+                    continue
+                try:
+                    error = future.exception()
+                    if error is not None:
+                        if on_error is not None:
+                            on_error(error)
+                    elif on_done is not None:
+                        on_done(*future.result())
+                except Exception:
+                    # A failing callback is reported like any other Tk callback error and
+                    # must not stop the results of later jobs from being delivered
+                    self.root.report_callback_exception(*sys.exc_info())
+        finally:
+            if self._pending:
+                self.root.after(self.poll_ms, self._poll)
+            else:
+                self._polling = False
+
+
+class Debouncer:
+    """Coalesce rapid triggers into at most one callback every ``delay_ms``.
+
+    Triggers that arrive while a callback is already scheduled are folded into
+    it, and the callback reads the controls when it fires, so it always renders
+    the latest value without queueing up stale ones.
+    """
+
+    def __init__(self, root, delay_ms, callback):
+        self.root = root
+        self.delay_ms = delay_ms
+        self.callback = callback
+        self._after_id = None
+
+    def trigger(self, *args):
+        if self._after_id is None:
+            self._after_id = self.root.after(self.delay_ms, self._fire)
+
+    def cancel(self):
+        if self._after_id is not None:
+            self.root.after_cancel(self._after_id)
+            self._after_id = None
+
+    def _fire(self):
+        self._after_id = None
+        self.callback()
@@ -0,0 +1,119 @@
+"""Load-test client for service.py.
+
+Sends ``--requests`` uploads from ``--concurrency`` threads, each thread on
+its own keep-alive connection, and prints throughput, latency percentiles and
+the status codes returned (429s show the service shedding load). The server's
+own /metrics are printed at the end.
+
+Usage:
+    python loadtest.py [--url http://127.0.0.1:8080] [--requests 200] [--concurrency 16]
+                       [--enhancer gamma] [--size 256x256 | --image photo.jpg]
+"""
+import argparse
+import http.client
+import io
+import json
+import threading
+import time
+from urllib.parse import urlsplit, urlencode
+
+import numpy as np
+
+from service import DEFAULT_PORT
+
+
+def synthetic_upload(width, height, seed=0):
+    """PNG bytes of a smooth random grayscale image."""
+    from PIL import Image
+
+    rng = np.random.default_rng(seed)
+    coarse = rng.integers(0, 256, (max(1, height // 16), max(1, width // 16)), dtype=np.uint8)
+    image = Image.fromarray(coarse).resize((width, height), Image.Resampling.BILINEAR)
+    output = io.BytesIO()
+    image.save(output, format="PNG")
+    return output.getvalue()
+
+
+def run_load(url, body, query, requests=200, concurrency=16):
+    """Return (per-request latencies in seconds, status counts, wall seconds)."""
+    parts = urlsplit(url)
+    path = f"/enhance?{urlencode(query)}"
+    latencies = []
+    statuses = {}
+    lock = threading.Lock()
+    remaining = iter(range(requests))
+
+    def client():
+        connection = http.client.HTTPConnection(parts.hostname, parts.port or DEFAULT_PORT, timeout=60)
+        try:
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        return
+                start = time.perf_counter()
+                try:
+                    connection.request("POST", path, body=body, headers={"Content-Type": "application/octet-stream"})
+                    response = connection.getresponse()
+                    response.read()
+                    status = response.status
+                except (OSError, http.client.HTTPException):
+                    connection.close()
+                    status = "error"
+                elapsed = time.perf_counter() - start
+                with lock:
+                    statuses[status] = statuses.get(status, 0) + 1
+                    if status == 200:
+                        latencies.append(elapsed)
+        finally:
+            connection.close()
+
+    threads = [threading.Thread(target=client) for _ in range(concurrency)]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return latencies, statuses, time.perf_counter() - start
+
+
+def fetch_metrics(url):
+    parts = urlsplit(url)
+    connection = http.client.HTTPConnection(parts.hostname, parts.port or DEFAULT_PORT, timeout=10)
+    try:
+        connection.request("GET", "/metrics")
+        return json.loads(connection.getresponse().read())
+    finally:
+        connection.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the enhancement service.")
+    parser.add_argument("--url", default=f"http://127.0.0.1:{DEFAULT_PORT}")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--enhancer", default="gamma")
+    parser.add_argument("--format", default="png")
+    parser.add_argument("--size", default="256x256", help="Synthetic upload size WxH (default: 256x256)")
+    parser.add_argument("--image", help="Upload this file instead of a synthetic image")
+    args = parser.parse_args(argv)
+
+    if args.image:
+        with open(args.image, "rb") as f:
+            body = f.read()
+    else:
+        width, height = (int(n) for n in args.size.lower().split("x"))
+        body = synthetic_upload(width, height)
+
+    latencies, statuses, elapsed = run_load(args.url, body, {"enhancer": args.enhancer, "format": args.format},
+                                            args.requests, args.concurrency)
+    print(f"{args.requests} requests of {len(body) / 1024:.1f} KB in {elapsed:.2f} s "
+          f"({args.requests / elapsed:.1f} req/s) with {args.concurrency} connections")
+    print("status: " + ", ".join(f"{status}={count}" for status, count in sorted(statuses.items(), key=str)))
+    if latencies:
+        p50, p90, p99 = np.percentile(np.array(latencies) * 1000, [50, 90, 99])
+        print(f"latency ms: p50 {p50:.1f}, p90 {p90:.1f}, p99 {p99:.1f}, max {max(latencies) * 1000:.1f}")
+    print("server metrics: " + json.dumps(fetch_metrics(args.url)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+"""Lookup-table engine for point operations on 8-bit and 16-bit images.
+
+A uint8 image only has 256 possible values, so any per-pixel operation can be
+evaluated once per value and applied with a single gather. Tables are memoised
+per (operation, parameters) and chains of operations are fused into one table.
+uint16 images use 65536-entry tables in the same way (``bit_depth`` 9 to 16),
+applied in chunks so the index temporaries stay small.
+"""
+from functools import lru_cache
+
+import numpy as np
+
+LUT_CACHE_SIZE = 128
+
+# Pixels gathered per np.take call when writing into an output buffer, bounds the intp index temporary to 8 MB
+GATHER_CHUNK = 1 << 20
+
+# All 256 possible uint8 input values, in order
+_LEVELS = np.arange(256, dtype=np.uint8)
+
+
+def _levels(bit_depth):
+    # Input levels of a table and the full-scale value they are normalised by. Deeper tables
+    # cover every uint16 value; values above the top of the bit depth count as full scale.
+    if bit_depth == 8:
+        return _LEVELS, 255
+    if not 8 < bit_depth <= 16:
+        raise ValueError(f"Unsupported bit depth: {bit_depth}")
+    max_value = (1 << bit_depth) - 1
+    return np.minimum(np.arange(65536), max_value), max_value
+
+
+def table_dtype(max_value):
+    """Smallest unsigned dtype holding every value up to ``max_value``."""
+    return np.uint8 if max_value <= 255 else np.uint16
+
+
+def _contrast_table(alpha, beta, bit_depth=8):
+    # Same arithmetic as NEW.contrast_adjustment, evaluated on every level
+    levels, max_value = _levels(bit_depth)
+    normalized = levels / float(max_value)
+    adjusted = 1 / (1 + np.exp(-alpha * (normalized - beta)))
+    return (adjusted * max_value).astype(table_dtype(max_value))
+
+
+def _gamma_table(gamma, bit_depth=8):
+    # Same arithmetic as NEW.gamma_correction, evaluated on every level
+    levels, max_value = _levels(bit_depth)
+    normalized = levels / float(max_value)
+    corrected = np.power(normalized, gamma)
+    return (corrected * max_value).clip(0, max_value).astype(table_dtype(max_value))
+
+
+POINT_OPS = {
+    "contrast": _contrast_table,
+    "gamma": _gamma_table,
+}
+
+
+def _freeze(table):
+    table.setflags(write=False)
+    return table
+
+
+@lru_cache(maxsize=LUT_CACHE_SIZE)
+def build_lut(op, *params, bit_depth=8):
+    """Return the cached, read-only table for a single point op.
+
+    8-bit tables have 256 uint8 entries; deeper ones have 65536 uint16 entries
+    scaled to the ``bit_depth`` full-scale value.
+    """
+    if op not in POINT_OPS:
+        raise ValueError(f"Unknown point operation: {op}")
+    return _freeze(POINT_OPS[op](*params, bit_depth=bit_depth))
+
+
+@lru_cache(maxsize=LUT_CACHE_SIZE)
+def build_chain_lut(chain):
+    """Fuse a chain of (op, *params) tuples into one cached table.
+
+    The chain is applied left to right, so ``(("gamma", 2.2), ("contrast", 2.5, 1.5))``
+    is gamma correction followed by sigmoid contrast.
+    """
+    table = _LEVELS
+    for op, *params in chain:
+        table = build_lut(op, *params)[table]
+    return _freeze(table.copy())
+
+
+def apply_lut(image_array, table, out=None):
+    """Map a uint8 image through a 256-entry table, or a uint16 image through a 65536-entry one."""
+    if image_array.dtype == np.uint8 and out is None:
+        return table[image_array]
+    if image_array.dtype not in (np.uint8, np.uint16):
+        raise ValueError("Lookup tables can only be applied to uint8 or uint16 images.")
+    if table.size < 1 << (8 * image_array.itemsize):
+        raise ValueError(f"A {image_array.dtype} image needs a {1 << (8 * image_array.itemsize)}-entry table.")
+
+    # Gather in chunks into the output, so the only full-size buffer is the result itself
+    if out is None:
+        out = np.empty(image_array.shape, dtype=table.dtype)
+    elif not out.flags.c_contiguous:
+        # Flattening a strided view would copy it and the result would never reach ``out``
+        raise ValueError("The output of a lookup table must be C-contiguous.")
+    flat, flat_out = image_array.reshape(-1), out.reshape(-1)
+    for start in range(0, flat.size, GATHER_CHUNK):
+        np.take(table, flat[start:start + GATHER_CHUNK], out=flat_out[start:start + GATHER_CHUNK])
+    return out
+
+
+def apply_chain(image_array, chain):
+    """Apply a chain of point ops to a uint8 image in a single pass."""
+    chain = tuple(tuple(step) for step in chain)
+    return apply_lut(image_array, build_chain_lut(chain))
+
+
+def contrast_lut(histogram, alpha=2.5, beta=1.5):
+    """Table of NEW.contrast_adjustment for an image with ``histogram``, which only sets the bit depth."""
+    return build_lut("contrast", alpha, beta, bit_depth=8 if len(histogram) == 256 else 16)
+
+
+def gamma_lut(histogram, gamma=2.2):
+    """Table of NEW.gamma_correction for an image with ``histogram``, which only sets the bit depth."""
+    return build_lut("gamma", gamma, bit_depth=8 if len(histogram) == 256 else 16)
+
+
+def clear_lut_cache():
+    build_lut.cache_clear()
+    build_chain_lut.cache_clear()
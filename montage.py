@@ -0,0 +1,219 @@
+"""Headless contact sheets and batch reports.
+
+Replaces the matplotlib figure of NEW.display_results. Each panel is reduced
+once to tile size, pasted into a single uint8 canvas with NumPy and labelled
+with PIL's built-in bitmap font. A histogram strip can be drawn under each
+panel, taken from a histogram the caller already has (the pipeline's, the
+result cache's, or one derived exactly from a LUT) before falling back to the
+tile's own. No display, GUI toolkit or plotting backend is involved, and a
+six-panel sheet takes a few milliseconds.
+
+Usage:
+    python montage.py IMAGE [--output sheet.png] [--outputs pdf,cdf,gamma] [--columns 4] [--no-histograms]
+"""
+import argparse
+import html
+import json
+import os
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from NEW import compute_histogram
+
+DEFAULT_TILE_SIZE = (320, 240)
+DEFAULT_COLUMNS = 4
+LABEL_HEIGHT = 16
+STRIP_HEIGHT = 40
+PADDING = 8
+BACKGROUND = 255
+BAR_COLOR = 64
+STRIP_BACKGROUND = 232
+
+TITLES = {
+    "original": "Original Image",
+    "pdf": "PDF Enhanced Image",
+    "cdf": "CDF Enhanced Image",
+    "contrast": "Contrast Enhanced Image",
+    "gamma": "Gamma Corrected Image",
+    "multi_scale": "Multi-Scale Enhanced Image",
+}
+
+Panel = namedtuple("Panel", "title image histogram", defaults=(None,))
+
+
+def make_tile(image_array, tile_size=DEFAULT_TILE_SIZE):
+    """Downscale an image to fit ``tile_size``; images that already fit are returned as they are."""
+    if image_array.dtype == np.uint16:
+        image_array = (image_array >> 8).astype(np.uint8)
+    height, width = image_array.shape[:2]
+    if width <= tile_size[0] and height <= tile_size[1]:
+        return image_array
+
+    from PIL import Image
+
+    image = Image.fromarray(image_array)
+    # Box reduction does most of the work, the resize only the last factor of two
+    image.thumbnail(tuple(tile_size), Image.Resampling.BILINEAR, reducing_gap=2.0)
+    return np.asarray(image)
+
+
+def lut_histogram(histogram, table):
+    """Exact histogram of ``table[image]`` from the histogram of ``image``."""
+    # One bin per table entry, so the top bin is the top level even when the table never reaches it
+    return np.bincount(table, weights=histogram, minlength=len(table))
+
+
+def histogram_strip(histogram, width, height=STRIP_HEIGHT):
+    """Bar chart of ``histogram`` as a (height, width) uint8 array, one column per group of bins."""
+    histogram = np.asarray(histogram, dtype=float)
+    edges = np.linspace(0, histogram.size, width + 1).astype(np.intp)[:-1]
+    columns = np.add.reduceat(histogram, edges)
+    # Square root scale, so the small bins stay visible next to a dominant peak
+    columns = np.sqrt(columns)
+    peak = columns.max()
+    bars = np.round(columns / peak * (height - 1)).astype(np.intp) if peak > 0 else np.zeros(width, np.intp)
+    rows = np.arange(height)[:, None]
+    return np.where(rows >= height - bars, BAR_COLOR, STRIP_BACKGROUND).astype(np.uint8)
+
+
+def histogram_summary(histogram):
+    """Mean, standard deviation, entropy and clipped fraction of a histogram, in input levels."""
+    histogram = np.asarray(histogram, dtype=float)
+    total = histogram.sum()
+    if total == 0:
+        return {"mean": 0.0, "std": 0.0, "entropy": 0.0, "clipped": 0.0}
+    p = histogram / total
+    levels = np.arange(histogram.size)
+    mean = p @ levels
+    nonzero = p[p > 0]
+    return {
+        "mean": float(mean),
+        "std": float(np.sqrt(max(p @ levels ** 2 - mean ** 2, 0.0))),
+        "entropy": float(-np.sum(nonzero * np.log2(nonzero))),
+        "clipped": float(p[0] + p[-1]),
+    }
+
+
+def contact_sheet(panels, columns=DEFAULT_COLUMNS, tile_size=DEFAULT_TILE_SIZE, strips=True):
+    """Composite ``Panel``s into one labelled uint8 sheet, grayscale unless a panel has colour.
+
+    ``strips`` adds a histogram strip under each tile.
+    """
+    from PIL import Image, ImageDraw
+
+    tiles = [make_tile(panel.image, tile_size) for panel in panels]
+    channels = 3 if any(tile.ndim == 3 for tile in tiles) else None
+    columns = max(1, min(columns, len(panels)))
+    rows = -(-len(panels) // columns)
+    cell_width = tile_size[0] + PADDING
+    cell_height = LABEL_HEIGHT + tile_size[1] + (STRIP_HEIGHT + 2 if strips else 0) + PADDING
+    shape = (rows * cell_height + PADDING, columns * cell_width + PADDING) + ((channels,) if channels else ())
+    sheet = np.full(shape, BACKGROUND, dtype=np.uint8)
+
+    for index, (panel, tile) in enumerate(zip(panels, tiles)):
+        top = (index // columns) * cell_height + PADDING + LABEL_HEIGHT
+        left = (index % columns) * cell_width + PADDING
+        if channels and tile.ndim == 2:
+            tile = tile[:, :, None]
+        # Centre the tile in its cell
+        y = top + (tile_size[1] - tile.shape[0]) // 2
+        x = left + (tile_size[0] - tile.shape[1]) // 2
+        sheet[y:y + tile.shape[0], x:x + tile.shape[1]] = tile
+        if strips:
+            histogram = panel.histogram if panel.histogram is not None else compute_histogram(tile)
+            strip = histogram_strip(histogram, tile_size[0])
+            y = top + tile_size[1] + 2
+            sheet[y:y + STRIP_HEIGHT, left:left + tile_size[0]] = strip[:, :, None] if channels else strip
+
+    image = Image.fromarray(sheet)
+    draw = ImageDraw.Draw(image)
+    for index, panel in enumerate(panels):
+        top = (index // columns) * cell_height + PADDING
+        left = (index % columns) * cell_width + PADDING
+        draw.text((left, top + 2), panel.title, fill=(0,) * (channels or 1))
+    return np.asarray(image)
+
+
+def results_sheet(original_image, results, histograms=None, **options):
+    """Sheet of the original and each named result, titled like the old matplotlib figure.
+
+    ``histograms`` maps panel names ("original" or a result name) to histograms already at hand.
+    """
+    histograms = histograms or {}
+    panels = [Panel(TITLES["original"], original_image, histograms.get("original"))]
+    panels += [Panel(TITLES.get(name, name), image, histograms.get(name)) for name, image in results.items()]
+    return contact_sheet(panels, **options)
+
+
+def save_sheet(sheet, output_path):
+    from PIL import Image
+
+    # Sheets are flat graphics; the fastest zlib level is plenty for them
+    Image.fromarray(sheet).save(output_path, compress_level=1)
+
+
+def write_report(entries, output_dir, title="Enhancement report"):
+    """Write report.json and report.html for a batch; returns their paths.
+
+    Each entry is a dict with "input", "sheet" (a path relative to
+    ``output_dir``) and "panels", which maps panel names to dicts of figures
+    such as those of ``histogram_summary``.
+    """
+    json_path = os.path.join(output_dir, "report.json")
+    html_path = os.path.join(output_dir, "report.html")
+    with open(json_path, "w") as f:
+        json.dump({"title": title, "images": entries}, f, indent=2)
+
+    sections = []
+    for entry in entries:
+        rows = "".join(
+            f"<tr><td>{html.escape(name)}</td>"
+            + "".join(f"<td>{figures.get(key, 0):.2f}</td>" for key in ("mean", "std", "entropy"))
+            + f"<td>{figures.get('clipped', 0):.2%}</td></tr>"
+            for name, figures in entry["panels"].items())
+        sections.append(
+            f"<section><h2>{html.escape(entry['input'])}</h2>"
+            f"<img src=\"{html.escape(entry['sheet'])}\" alt=\"\">"
+            f"<table><tr><th>panel</th><th>mean</th><th>std</th><th>entropy</th><th>clipped</th></tr>{rows}</table>"
+            f"</section>")
+    with open(html_path, "w") as f:
+        f.write(f"<!DOCTYPE html>\n<html><head><meta charset=\"utf-8\"><title>{html.escape(title)}</title>"
+                "<style>body{font-family:sans-serif}img{max-width:100%}td,th{padding:0 8px;text-align:right}"
+                "</style></head>\n<body><h1>" + html.escape(title) + "</h1>\n" + "\n".join(sections)
+                + "\n</body></html>\n")
+    return json_path, html_path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a contact sheet of an image and its enhancements.")
+    parser.add_argument("image", help="Input image")
+    parser.add_argument("--output", help="Sheet path (default: IMAGE_sheet.png)")
+    parser.add_argument("--outputs", default=",".join(name for name in TITLES if name != "original"),
+                        help="Comma-separated enhancements to show")
+    parser.add_argument("--columns", type=int, default=DEFAULT_COLUMNS)
+    parser.add_argument("--tile", default="x".join(map(str, DEFAULT_TILE_SIZE)), help="Tile size WxH")
+    parser.add_argument("--no-histograms", action="store_true", help="Leave out the histogram strips")
+    args = parser.parse_args(argv)
+
+    from NEW import load_image
+    from pipeline import enhance
+
+    outputs = [name.strip() for name in args.outputs.split(",") if name.strip()]
+    tile_size = tuple(int(n) for n in args.tile.lower().split("x"))
+    image_array = load_image(args.image)
+    results = enhance(image_array, outputs + ["histogram"])
+    histograms = {"original": results.pop("histogram")}
+
+    start = time.perf_counter()
+    sheet = results_sheet(image_array, {name: results[name] for name in outputs}, histograms,
+                          columns=args.columns, tile_size=tile_size, strips=not args.no_histograms)
+    elapsed = time.perf_counter() - start
+    output_path = args.output or os.path.splitext(args.image)[0] + "_sheet.png"
+    save_sheet(sheet, output_path)
+    print(f"{len(outputs) + 1} panels in {elapsed * 1000:.1f} ms -> {output_path}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,249 @@
+"""Shared-memory multi-process enhancement of single very large images.
+
+The point enhancers (PDF, CDF, contrast, gamma) are one histogram and one
+table gather, both of which split cleanly into row bands. Here the input and
+output live in ``multiprocessing.shared_memory`` blocks and a persistent pool
+of worker processes attaches to them by name, so no pixel data is pickled:
+a task carries only the block names, its row range and, for the gather, the
+lookup table.
+
+The histogram is a parallel reduction: every band returns its partial
+histogram and the parent sums them. The table is then built once, exactly
+as the serial path builds it (see ``Enhancer.build_table``), and every band
+is gathered through it into the shared output, so the result is identical
+to the single-process one.
+
+Usage:
+    python parallel.py IMAGE [--enhancer pdf] [--workers 1,2,4,8] [--repeats 3]
+"""
+import argparse
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import resource_tracker, shared_memory
+
+import numpy as np
+
+from NEW import count_levels
+from lut import apply_lut
+from registry import get_enhancer
+
+# Row bands per worker, so a slow band does not leave the other workers idle
+BANDS_PER_WORKER = 4
+
+
+class SharedArray:
+    """An ndarray in a shared memory block that other processes attach to by ``spec``."""
+
+    def __init__(self, shape, dtype, name=None):
+        dtype = np.dtype(dtype)
+        self._owner = name is None
+        if self._owner:
+            self._shm = shared_memory.SharedMemory(create=True, size=max(1, int(np.prod(shape)) * dtype.itemsize))
+        else:
+            self._shm = _attach_block(name)
+        self.array = np.ndarray(shape, dtype=dtype, buffer=self._shm.buf)
+
+    @classmethod
+    def from_array(cls, image_array):
+        shared = cls(image_array.shape, image_array.dtype)
+        shared.array[...] = image_array
+        return shared
+
+    @classmethod
+    def attach(cls, spec):
+        name, shape, dtype = spec
+        return cls(shape, dtype, name)
+
+    @property
+    def spec(self):
+        return self._shm.name, self.array.shape, self.array.dtype.str
+
+    def close(self):
+        """Detach, and free the block if this process created it."""
+        self.array = None
+        self._shm.close()
+        if self._owner:
+            self._shm.unlink()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def _attach_block(name):
+    # Only the creating process may free a block. Attaching must not register it with the
+    # resource tracker, which would unlink it, and warn about a leak, when a worker exits.
+    if sys.version_info >= (3, 13):
+        return shared_memory.SharedMemory(name=name, track=False)
+    register = resource_tracker.register
+    resource_tracker.register = lambda name, rtype: None
+    try:
+        return shared_memory.SharedMemory(name=name)
+    finally:
+        resource_tracker.register = register
+
+
+def _band_histogram(spec, start, stop, levels):
+    image = SharedArray.attach(spec)
+    try:
+        return count_levels(image.array[start:stop], levels)
+    finally:
+        image.close()
+
+
+def _band_gather(spec, out_spec, table, start, stop):
+    image, out = SharedArray.attach(spec), SharedArray.attach(out_spec)
+    try:
+        apply_lut(image.array[start:stop], table, out.array[start:stop])
+    finally:
+        image.close()
+        out.close()
+
+
+def _ready(_):
+    return os.getpid()
+
+
+def _levels(dtype):
+    if dtype not in (np.uint8, np.uint16):
+        raise ValueError("Input must be a uint8 or uint16 image.")
+    return 256 if dtype == np.uint8 else 65536
+
+
+def enhancer_table(enhancer, dtype, histogram, **params):
+    """Lookup table of a registered point enhancer; ``histogram()`` is only called when the table needs it."""
+    registered = get_enhancer(enhancer)
+    if registered.table is None:
+        raise ValueError(f"{enhancer} is not a point operation and cannot run in row bands")
+    # Tables declared as independent of the pixel counts (contrast, gamma) skip the histogram pass
+    if registered.table_histogram:
+        counts = histogram()
+    else:
+        counts = np.zeros(_levels(dtype), dtype=np.int64)
+    return registered.build_table(counts, **params)
+
+
+def enhance_serial(image_array, enhancer="pdf", out=None, **params):
+    """The steps of ``BandPool.enhance`` in this process alone: the baseline of its speedup."""
+    levels = _levels(image_array.dtype)
+    table = enhancer_table(enhancer, image_array.dtype, lambda: count_levels(image_array, levels), **params)
+    return apply_lut(image_array, table, np.empty(image_array.shape, table.dtype) if out is None else out)
+
+
+class BandPool:
+    """A persistent pool of worker processes that enhance row bands of ``SharedArray`` images."""
+
+    def __init__(self, workers=None, bands_per_worker=BANDS_PER_WORKER):
+        self.workers = workers or os.cpu_count() or 1
+        self.bands_per_worker = bands_per_worker
+        self._executor = ProcessPoolExecutor(max_workers=self.workers)
+        # Start every worker now, so the first image does not pay for process start-up
+        list(self._executor.map(_ready, range(self.workers)))
+
+    def bands(self, height):
+        count = max(1, min(height, self.workers * self.bands_per_worker))
+        edges = np.linspace(0, height, count + 1).astype(int)
+        return list(zip(edges[:-1], edges[1:]))
+
+    def histogram(self, image):
+        """Histogram of a shared uint8 or uint16 image, summed from per-band partial histograms."""
+        levels = _levels(image.array.dtype)
+        futures = [self._executor.submit(_band_histogram, image.spec, start, stop, levels)
+                   for start, stop in self.bands(image.array.shape[0])]
+        return sum(future.result() for future in futures)
+
+    def map_table(self, image, table, out=None):
+        """Gather every band of ``image`` through ``table`` into ``out`` (a new ``SharedArray`` by default)."""
+        if out is None:
+            out = SharedArray(image.array.shape, table.dtype)
+        futures = [self._executor.submit(_band_gather, image.spec, out.spec, table, start, stop)
+                   for start, stop in self.bands(image.array.shape[0])]
+        for future in futures:
+            future.result()
+        return out
+
+    def table(self, image, enhancer="pdf", **params):
+        """The lookup table ``enhancer`` maps ``image`` through, from a parallel histogram if it needs one."""
+        return enhancer_table(enhancer, image.array.dtype, lambda: self.histogram(image), **params)
+
+    def enhance(self, image, enhancer="pdf", out=None, **params):
+        """Enhance a shared image; returns the shared output."""
+        return self.map_table(image, self.table(image, enhancer, **params), out)
+
+    def close(self):
+        self._executor.shutdown()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+def enhance_parallel(image_array, enhancer="pdf", pool=None, **params):
+    """Enhance an ordinary array through shared memory; copies it in and the result out."""
+    own_pool = pool is None
+    pool = BandPool() if own_pool else pool
+    try:
+        with SharedArray.from_array(image_array) as image, pool.enhance(image, enhancer, **params) as out:
+            return out.array.copy()
+    finally:
+        if own_pool:
+            pool.close()
+
+
+def _best_time(func, repeats):
+    best = float("inf")
+    for _ in range(repeats):
+        start = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time band-parallel enhancement of one image per worker count.")
+    parser.add_argument("image", help="Input image")
+    parser.add_argument("--enhancer", default="pdf", help="pdf, cdf, contrast or gamma (default: pdf)")
+    parser.add_argument("--workers", help="Comma-separated worker counts (default: powers of two up to the CPU count)")
+    parser.add_argument("--repeats", type=int, default=3, help="Runs per case; the best is reported (default: 3)")
+    parser.add_argument("--keep-depth", action="store_true", help="Keep 16-bit images at 16 bits")
+    args = parser.parse_args(argv)
+
+    from NEW import load_image
+
+    if args.workers:
+        counts = [int(n) for n in args.workers.split(",")]
+    else:
+        cpus = os.cpu_count() or 1
+        counts = sorted({1 << n for n in range(cpus.bit_length())} | {cpus})
+
+    image_array = load_image(args.image, keep_depth=args.keep_depth)
+    enhance = get_enhancer(args.enhancer).bind()
+    expected = enhance(image_array)
+    # Speedups are against the same histogram, table and gather run in this process; the
+    # regular single-process path is timed as well, as a reference
+    buffer = np.empty_like(expected)
+    serial = _best_time(lambda: enhance_serial(image_array, args.enhancer, buffer), args.repeats)
+    reference = _best_time(lambda: enhance(image_array), args.repeats)
+    print(f"{args.enhancer} on {image_array.shape[1]}x{image_array.shape[0]} {image_array.dtype} "
+          f"({image_array.size / 1e6:.0f} MP), {os.cpu_count()} CPUs")
+    print(f"{'serial':>8} {serial * 1000:9.1f} ms  (regular path {reference * 1000:.1f} ms)")
+
+    with SharedArray.from_array(image_array) as image, SharedArray(image_array.shape, expected.dtype) as out:
+        for workers in counts:
+            with BandPool(workers) as pool:
+                pool.enhance(image, args.enhancer, out)
+                if not np.array_equal(out.array, expected):
+                    raise SystemExit(f"{workers} workers: output differs from the serial path")
+                seconds = _best_time(lambda: pool.enhance(image, args.enhancer, out), args.repeats)
+            print(f"{workers:>8} {seconds * 1000:9.1f} ms  {serial / seconds:5.2f}x speedup  "
+                  f"{serial / seconds / workers:4.0%} per-core efficiency")
+
+
+if __name__ == "__main__":
+    main()
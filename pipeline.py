@@ -0,0 +1,166 @@
+"""Pipeline graph for the enhancement steps.
+
+A ``Pipeline`` is a set of named nodes, each computed from the results of the
+nodes it depends on plus its own keyword parameters. Running it for a list of
+requested outputs evaluates only the nodes those outputs need, each exactly
+once, so the PDF and CDF branches share one histogram and one ``ImageStats``.
+Nodes whose dependencies are ready run concurrently on a thread pool; the
+large-array work in NumPy and OpenCV releases the GIL, so independent
+branches overlap on multi-core machines.
+
+Usage:
+    python pipeline.py IMAGE [--outputs pdf,cdf,gamma] [--workers N]
+"""
+import argparse
+import os
+import time
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+
+Node = namedtuple("Node", "name func deps defaults")
+
+
+class Pipeline:
+    def __init__(self):
+        self.nodes = {}
+
+    def add_input(self, name):
+        self.nodes[name] = Node(name, None, (), {})
+
+    def add(self, name, func, deps=(), **defaults):
+        """Add a node computing ``func(*dependency_results, **params)``.
+
+        Dependencies must already be in the graph, which keeps it acyclic.
+        """
+        unknown = [dep for dep in deps if dep not in self.nodes]
+        if unknown:
+            raise ValueError(f"Unknown dependencies of {name}: {', '.join(unknown)}")
+        self.nodes[name] = Node(name, func, tuple(deps), defaults)
+
+    def required(self, outputs):
+        """Names of the nodes needed for ``outputs``, dependencies first."""
+        order = []
+        seen = set()
+
+        def visit(name):
+            if name in seen:
+                return
+            if name not in self.nodes:
+                raise ValueError(f"Unknown pipeline node: {name}")
+            seen.add(name)
+            for dep in self.nodes[name].deps:
+                visit(dep)
+            order.append(name)
+
+        for name in outputs:
+            visit(name)
+        return order
+
+    def run(self, inputs, outputs, params=None, workers=None, on_result=None, timings=None):
+        """Compute ``outputs`` and return them as a dict.
+
+        ``params`` maps node names to keyword arguments overriding the node's
+        defaults. ``on_result(name, value)`` is called in the calling thread as
+        each requested output finishes, and when ``timings`` is a dict it
+        receives the seconds spent in every node that ran.
+        """
+        params = params or {}
+        unknown = [name for name in params if name not in self.nodes]
+        if unknown:
+            raise ValueError(f"Unknown pipeline nodes: {', '.join(unknown)}")
+
+        order = self.required(outputs)
+        results = {}
+        for name in order:
+            if self.nodes[name].func is None:
+                if name not in inputs:
+                    raise ValueError(f"Missing pipeline input: {name}")
+                results[name] = inputs[name]
+        pending = [name for name in order if name not in results]
+        requested = set(outputs)
+
+        workers = workers or os.cpu_count() or 1
+        with ThreadPoolExecutor(max_workers=max(1, min(workers, len(pending))),
+                                thread_name_prefix="pipeline") as executor:
+            running = {}
+            while pending or running:
+                ready = [name for name in pending if all(dep in results for dep in self.nodes[name].deps)]
+                for name in ready:
+                    pending.remove(name)
+                    future = executor.submit(self._run_node, self.nodes[name], results, params.get(name, {}))
+                    running[future] = name
+                finished, _ = wait(running, return_when=FIRST_COMPLETED)
+                for future in finished:
+                    name = running.pop(future)
+                    results[name], seconds = future.result()
+                    if timings is not None:
+                        timings[name] = seconds
+                    if on_result is not None and name in requested:
+                        on_result(name, results[name])
+
+        return {name: results[name] for name in outputs}
+
+    @staticmethod
+    def _run_node(node, results, params):
+        start = time.perf_counter()
+        value = node.func(*(results[dep] for dep in node.deps), **{**node.defaults, **params})
+        return value, time.perf_counter() - start
+
+
+def build_enhancement_pipeline():
+    """Graph of the five NEW.py enhancements and their shared intermediates."""
+    from NEW import compute_histogram, contrast_adjustment, gamma_correction, multi_scale_enhancement, map_with_table
+    from stats import ImageStats
+
+    pipeline = Pipeline()
+    pipeline.add_input("image")
+    pipeline.add("histogram", compute_histogram, ("image",))
+    pipeline.add("stats", ImageStats, ("histogram",))
+    pipeline.add("pdf_lut", lambda stats: stats.pdf_lut, ("stats",))
+    pipeline.add("cdf_lut", lambda stats: stats.cdf_lut, ("stats",))
+    pipeline.add("pdf", map_with_table, ("image", "pdf_lut"))
+    pipeline.add("cdf", map_with_table, ("image", "cdf_lut"))
+    pipeline.add("contrast", contrast_adjustment, ("image",))
+    pipeline.add("gamma", gamma_correction, ("image",))
+    pipeline.add("multi_scale", multi_scale_enhancement, ("image",))
+    return pipeline
+
+
+OUTPUTS = ("pdf", "cdf", "contrast", "gamma", "multi_scale")
+
+_pipeline = None
+
+
+def enhance(image_array, outputs=OUTPUTS, params=None, workers=None, on_result=None, timings=None):
+    """Run the requested enhancements of one image; see ``Pipeline.run``."""
+    global _pipeline
+    if _pipeline is None:
+        _pipeline = build_enhancement_pipeline()
+    return _pipeline.run({"image": image_array}, list(outputs), params, workers, on_result, timings)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the enhancement graph on one image and time each node.")
+    parser.add_argument("image", help="Input image")
+    parser.add_argument("--outputs", default=",".join(OUTPUTS),
+                        help=f"Comma-separated subset of: {', '.join(OUTPUTS)}")
+    parser.add_argument("--workers", type=int, default=None, help="Threads (default: CPU count; 1 runs serially)")
+    args = parser.parse_args(argv)
+
+    from NEW import load_image
+
+    outputs = [name.strip() for name in args.outputs.split(",") if name.strip()]
+    image_array = load_image(args.image)
+    enhance(image_array, outputs, workers=args.workers)  # Warm up imports and cached tables
+
+    timings = {}
+    start = time.perf_counter()
+    enhance(image_array, outputs, workers=args.workers, timings=timings)
+    elapsed = time.perf_counter() - start
+    for name, seconds in sorted(timings.items(), key=lambda item: item[1], reverse=True):
+        print(f"{name:<12} {seconds * 1000:>9.2f} ms")
+    print(f"{'total':<12} {elapsed * 1000:>9.2f} ms wall, {sum(timings.values()) * 1000:.2f} ms in nodes")
+
+
+if __name__ == "__main__":
+    main()
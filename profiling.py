@@ -0,0 +1,221 @@
+"""Per-stage profiling for the enhancement pipeline.
+
+Functions in NEW.py are wrapped with ``profiled(category)``. While the global
+``PROFILER`` is disabled the wrapper costs one attribute check; when enabled,
+each call records wall time, CPU time of the calling thread, bytes processed
+and (optionally) net traced memory allocation. Records can be exported as a
+Chrome trace / Perfetto JSON file, aggregated into a summary table, or pushed
+to listeners such as the GUI status bar.
+
+Usage:
+    python profiling.py IMAGE [--trace trace.json] [--memory]
+"""
+import argparse
+import contextlib
+import functools
+import io
+import itertools
+import json
+import os
+import tempfile
+import threading
+import time
+import tracemalloc
+from collections import deque, namedtuple
+
+MAX_RECORDS = 100000
+
+StageRecord = namedtuple(
+    "StageRecord", "seq name category start_ns wall_ns cpu_ns nbytes alloc_bytes pid tid")
+
+
+class Profiler:
+    def __init__(self, max_records=MAX_RECORDS):
+        self.enabled = False
+        self.trace_memory = False
+        self.records = deque(maxlen=max_records)
+        self._listeners = []
+        self._seq = itertools.count(1)
+        self._last_seq = 0
+
+    def enable(self, trace_memory=False):
+        self.trace_memory = trace_memory
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        self.trace_memory = False
+
+    def clear(self):
+        self.records.clear()
+
+    def add_listener(self, listener):
+        """Call ``listener(record)`` for every finished stage, from the thread that ran it."""
+        self._listeners.append(listener)
+
+    def remove_listener(self, listener):
+        self._listeners.remove(listener)
+
+    def mark(self):
+        """Sequence number of the latest record, for use with ``records_since``."""
+        return self._last_seq
+
+    def records_since(self, seq):
+        return [record for record in list(self.records) if record.seq > seq]
+
+    def stage(self, name, category="stage", nbytes=0):
+        """Context manager timing one stage; a no-op while disabled."""
+        if not self.enabled:
+            return _NULL_STAGE
+        return _Stage(self, name, category, nbytes)
+
+    def _add(self, record):
+        self.records.append(record)
+        self._last_seq = record.seq
+        for listener in list(self._listeners):
+            listener(record)
+
+    def chrome_trace(self, records=None):
+        """Return the records as a Chrome trace / Perfetto JSON document."""
+        records = list(self.records) if records is None else records
+        events = [{
+            "name": record.name,
+            "cat": record.category,
+            "ph": "X",
+            "ts": record.start_ns / 1000,
+            "dur": record.wall_ns / 1000,
+            "pid": record.pid,
+            "tid": record.tid,
+            "args": {"cpu_ms": record.cpu_ns / 1e6, "bytes": record.nbytes, "alloc_bytes": record.alloc_bytes},
+        } for record in records]
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def export_chrome_trace(self, path, records=None):
+        with open(path, "w") as f:
+            json.dump(self.chrome_trace(records), f)
+
+    def summary(self, records=None):
+        """Aggregate records per stage name, slowest total first."""
+        records = list(self.records) if records is None else records
+        rows = {}
+        for record in records:
+            row = rows.setdefault(record.name, {"name": record.name, "category": record.category, "calls": 0,
+                                                "wall_s": 0.0, "cpu_s": 0.0, "bytes": 0, "alloc_bytes": 0})
+            row["calls"] += 1
+            row["wall_s"] += record.wall_ns / 1e9
+            row["cpu_s"] += record.cpu_ns / 1e9
+            row["bytes"] += record.nbytes
+            row["alloc_bytes"] += record.alloc_bytes
+        for row in rows.values():
+            row["mb_per_s"] = row["bytes"] / 1e6 / row["wall_s"] if row["wall_s"] else 0.0
+        return sorted(rows.values(), key=lambda row: row["wall_s"], reverse=True)
+
+    def format_summary(self, records=None):
+        lines = [f"{'stage':<28} {'category':<10} {'calls':>6} {'wall ms':>10} {'cpu ms':>10} "
+                 f"{'MB':>9} {'MB/s':>9} {'alloc MB':>9}"]
+        for row in self.summary(records):
+            lines.append(f"{row['name']:<28} {row['category']:<10} {row['calls']:>6} {row['wall_s'] * 1000:>10.2f} "
+                         f"{row['cpu_s'] * 1000:>10.2f} {row['bytes'] / 1e6:>9.2f} {row['mb_per_s']:>9.1f} "
+                         f"{row['alloc_bytes'] / 1e6:>9.2f}")
+        return "\n".join(lines)
+
+
+class _Stage:
+    __slots__ = ("profiler", "name", "category", "nbytes", "start_ns", "cpu_start_ns", "alloc_start")
+
+    def __init__(self, profiler, name, category, nbytes):
+        self.profiler = profiler
+        self.name = name
+        self.category = category
+        self.nbytes = nbytes
+
+    def __enter__(self):
+        self.alloc_start = tracemalloc.get_traced_memory()[0] if self.profiler.trace_memory else 0
+        self.cpu_start_ns = time.thread_time_ns()
+        self.start_ns = time.perf_counter_ns()
+        return self
+
+    def __exit__(self, *exc_info):
+        wall_ns = time.perf_counter_ns() - self.start_ns
+        cpu_ns = time.thread_time_ns() - self.cpu_start_ns
+        alloc = tracemalloc.get_traced_memory()[0] - self.alloc_start if self.profiler.trace_memory else 0
+        self.profiler._add(StageRecord(next(self.profiler._seq), self.name, self.category, self.start_ns,
+                                       wall_ns, cpu_ns, self.nbytes, alloc, os.getpid(), threading.get_ident()))
+        return False
+
+
+class _NullStage:
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NULL_STAGE = _NullStage()
+
+PROFILER = Profiler()
+
+
+def stage(name, category="stage", nbytes=0):
+    return PROFILER.stage(name, category, nbytes)
+
+
+def _input_bytes(args):
+    # Bytes of the first argument: an array's buffer or the size of a file path
+    if not args:
+        return 0
+    first = args[0]
+    nbytes = getattr(first, "nbytes", None)
+    if nbytes is not None:
+        return nbytes
+    if isinstance(first, str) and os.path.isfile(first):
+        return os.path.getsize(first)
+    return 0
+
+
+def profiled(category, name=None):
+    """Decorator recording each call of the function as a stage of ``category``."""
+    def decorate(func):
+        stage_name = name or func.__name__
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            if not PROFILER.enabled:
+                return func(*args, **kwargs)
+            with _Stage(PROFILER, stage_name, category, _input_bytes(args)):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile the full enhancement pipeline on one image.")
+    parser.add_argument("image", help="Input image")
+    parser.add_argument("--trace", help="Write a Chrome trace / Perfetto JSON file here")
+    parser.add_argument("--memory", action="store_true", help="Also record allocated memory per stage")
+    args = parser.parse_args(argv)
+
+    # Use the imported module's profiler: NEW.py is instrumented against it, not against __main__
+    from profiling import PROFILER as profiler
+    from NEW import process_image
+
+    profiler.enable(trace_memory=args.memory)
+    with tempfile.TemporaryDirectory() as workdir:
+        outputs = [os.path.join(workdir, f"{name}.jpg") for name in ("pdf", "cdf", "contrast", "gamma", "multi_scale")]
+        with contextlib.redirect_stdout(io.StringIO()):
+            process_image(args.image, *outputs, display=False)
+    profiler.disable()
+
+    print(profiler.format_summary())
+    if args.trace:
+        profiler.export_chrome_trace(args.trace)
+        print(f"Trace written to: {args.trace}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,232 @@
+"""Laplacian pyramid multi-scale enhancement.
+
+The image is decomposed into Gaussian levels, each level is enhanced at its
+own resolution with one of the existing enhancers (CLAHE, adaptive PDF/CDF,
+gamma, contrast) and the band-pass detail of every enhanced level is added
+back, scaled by a per-level gain, while rebuilding from the coarsest level up.
+With no enhancers and unit gains the rebuild returns the input unchanged.
+
+Each level has a quarter of the pixels of the one above, so the whole
+pyramid costs about 4/3 of the work done on the full-resolution level and
+runtime grows linearly with pixel count. Float buffers are kept in a
+``PyramidWorkspace`` and reused across levels and calls.
+
+Usage:
+    python pyramid.py --benchmark [--sizes 1,4,16] [--levels 4]
+"""
+import argparse
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from NEW import contrast_adjustment, gamma_correction, map_with_table
+from clahe import apply_clahe
+from stats import ImageStats
+
+DEFAULT_LEVELS = 4
+
+# Finest level first; the last entry is the coarse base of the pyramid
+DEFAULT_LEVEL_PARAMS = (
+    {"gain": 1.4},
+    {"gain": 1.2},
+    {"enhancer": "clahe", "clip_limit": 2.0, "tile_grid_size": (8, 8)},
+    {"enhancer": "clahe", "clip_limit": 2.0, "tile_grid_size": (4, 4)},
+)
+
+
+def _pdf(image_array, params):
+    return map_with_table(image_array, ImageStats.from_image(image_array).pdf_lut)
+
+def _cdf(image_array, params):
+    return map_with_table(image_array, ImageStats.from_image(image_array).cdf_lut)
+
+def _clahe(image_array, params):
+    return apply_clahe(image_array, params.get("clip_limit", 2.0), params.get("tile_grid_size", (8, 8)))
+
+def _gamma(image_array, params):
+    return gamma_correction(image_array, params.get("gamma", 2.2))
+
+def _contrast(image_array, params):
+    return contrast_adjustment(image_array, params.get("alpha", 2.5), params.get("beta", 1.5))
+
+
+LEVEL_ENHANCERS = {
+    "pdf": _pdf,
+    "cdf": _cdf,
+    "clahe": _clahe,
+    "gamma": _gamma,
+    "contrast": _contrast,
+}
+
+
+class PyramidWorkspace:
+    """Scratch buffers keyed by name and shape, reused between calls on images of one size.
+
+    ``begin`` frees the buffers of the previous image when the size changes,
+    so a workspace only ever holds one image's pyramid.
+    """
+
+    def __init__(self):
+        self._buffers = {}
+        self._shape = None
+
+    def begin(self, shape):
+        shape = tuple(shape)
+        if shape != self._shape:
+            self.clear()
+            self._shape = shape
+
+    def get(self, name, shape, dtype=np.float32):
+        key = (name, shape, np.dtype(dtype))
+        buffer = self._buffers.get(key)
+        if buffer is None:
+            buffer = self._buffers[key] = np.empty(shape, dtype=dtype)
+        return buffer
+
+    def clear(self):
+        self._buffers.clear()
+        self._shape = None
+
+
+_local = threading.local()
+
+
+def _default_workspace():
+    workspace = getattr(_local, "workspace", None)
+    if workspace is None:
+        workspace = _local.workspace = PyramidWorkspace()
+    return workspace
+
+
+def level_shapes(shape, levels):
+    """Shapes of the Gaussian levels, as produced by repeated cv2.pyrDown."""
+    shapes = [tuple(shape)]
+    for _ in range(1, levels):
+        height, width = shapes[-1]
+        shapes.append(((height + 1) // 2, (width + 1) // 2))
+    return shapes
+
+
+def max_levels(shape):
+    """Deepest pyramid whose coarsest level is still at least 8 pixels on each side."""
+    levels = 1
+    height, width = shape
+    while min(height, width) >= 16:
+        height, width = (height + 1) // 2, (width + 1) // 2
+        levels += 1
+    return levels
+
+
+def _enhance_level(level_image, params):
+    enhancer = params.get("enhancer")
+    if enhancer is None:
+        return level_image
+    if enhancer not in LEVEL_ENHANCERS:
+        raise ValueError(f"Unknown level enhancer: {enhancer}")
+    return LEVEL_ENHANCERS[enhancer](level_image, params)
+
+
+def laplacian_pyramid_enhancement(image_array, levels=DEFAULT_LEVELS, level_params=None, workspace=None,
+                                  timings=None):
+    """Enhance a 2-D uint8 image level by level and rebuild it from its pyramid.
+
+    ``level_params`` lists one dict per level, finest first, with an optional
+    ``"enhancer"`` name from ``LEVEL_ENHANCERS``, that enhancer's parameters and
+    a ``"gain"`` for the level's detail band (ignored on the base level).
+    When ``timings`` is a list, ``(level, shape, seconds)`` is appended for
+    every level.
+    """
+    if not isinstance(image_array, np.ndarray) or image_array.ndim != 2 or image_array.dtype != np.uint8:
+        raise ValueError("Only 2-D uint8 grayscale images are supported.")
+
+    level_params = list(DEFAULT_LEVEL_PARAMS if level_params is None else level_params)
+    levels = max(1, min(levels, max_levels(image_array.shape)))
+    level_params = (level_params + [{}] * levels)[:levels]
+    workspace = workspace or _default_workspace()
+    workspace.begin(image_array.shape)
+    shapes = level_shapes(image_array.shape, levels)
+    seconds = [0.0] * levels
+
+    # Decompose and enhance every level at its own resolution
+    gaussian = [image_array]
+    enhanced = []
+    for i in range(levels):
+        start = time.perf_counter()
+        if i > 0:
+            gaussian.append(cv2.pyrDown(gaussian[i - 1], dst=workspace.get("gaussian", shapes[i], np.uint8)))
+        enhanced.append(_enhance_level(gaussian[i], level_params[i]))
+        seconds[i] += time.perf_counter() - start
+
+    # Rebuild from the base: upsample the running result and add each enhanced level's detail band
+    start = time.perf_counter()
+    result = workspace.get("result", shapes[-1])
+    np.copyto(result, enhanced[-1])
+    seconds[-1] += time.perf_counter() - start
+    for i in range(levels - 2, -1, -1):
+        start = time.perf_counter()
+        size = (shapes[i][1], shapes[i][0])
+        if enhanced[i] is gaussian[i]:
+            down = gaussian[i + 1]
+        else:
+            down = cv2.pyrDown(enhanced[i], dst=workspace.get("down", shapes[i + 1], np.uint8))
+        down_float = workspace.get("down_float", shapes[i + 1])
+        np.copyto(down_float, down)
+        band = cv2.pyrUp(down_float, dst=workspace.get("band", shapes[i]), dstsize=size)
+        np.subtract(enhanced[i], band, out=band)
+        gain = level_params[i].get("gain", 1.0)
+        if gain != 1.0:
+            band *= gain
+        upsampled = cv2.pyrUp(result, dst=workspace.get("result", shapes[i]), dstsize=size)
+        result = np.add(upsampled, band, out=upsampled)
+        seconds[i] += time.perf_counter() - start
+
+    if timings is not None:
+        timings.extend((i, shapes[i], seconds[i]) for i in range(levels))
+
+    np.clip(result, 0, 255, out=result)
+    return np.rint(result).astype(np.uint8)
+
+
+def benchmark_levels(megapixels=(1, 4, 16), levels=DEFAULT_LEVELS, repeats=3):
+    """Time each pyramid level on synthetic images; returns rows of per-level costs."""
+    rng = np.random.default_rng(0)
+    workspace = PyramidWorkspace()
+    rows = []
+    for mp in megapixels:
+        width = int(np.sqrt(mp * 1e6 * 4 / 3))
+        height = int(mp * 1e6 / width)
+        image_array = cv2.GaussianBlur(rng.integers(0, 256, (height, width), dtype=np.uint8), (0, 0), 3)
+        best = None
+        for _ in range(repeats):
+            timings = []
+            laplacian_pyramid_enhancement(image_array, levels, workspace=workspace, timings=timings)
+            if best is None or sum(t[2] for t in timings) < sum(t[2] for t in best):
+                best = timings
+        total = sum(t[2] for t in best)
+        for level, shape, seconds in best:
+            rows.append({"megapixels": mp, "level": level, "shape": shape, "seconds": seconds})
+        rows.append({"megapixels": mp, "level": "total", "shape": image_array.shape, "seconds": total})
+    return rows
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Laplacian pyramid enhancement benchmark.")
+    parser.add_argument("--benchmark", action="store_true", help="Print the cost of every pyramid level")
+    parser.add_argument("--sizes", default="1,4,16", help="Comma-separated image sizes in megapixels")
+    parser.add_argument("--levels", type=int, default=DEFAULT_LEVELS)
+    args = parser.parse_args(argv)
+    if not args.benchmark:
+        parser.error("Nothing to do; pass --benchmark")
+
+    sizes = [float(size) for size in args.sizes.split(",")]
+    print(f"{'MP':>6} {'level':>6} {'shape':>14} {'ms':>9} {'ms/MP':>8}")
+    for row in benchmark_levels(sizes, args.levels):
+        pixels = row["shape"][0] * row["shape"][1] / 1e6
+        print(f"{row['megapixels']:>6g} {row['level']:>6} {'x'.join(map(str, row['shape'])):>14} "
+              f"{row['seconds'] * 1000:>9.2f} {row['seconds'] * 1000 / pixels:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""Registry of the enhancers offered by the GUI and command-line tools.
+
+Each enhancer declares its name, its parameters and the heavy modules it
+depends on, and names its implementation as a "module:function" string. The
+implementation module is imported the first time the enhancer runs, so
+listing the enhancers (to build the GUI buttons, say) imports nothing beyond
+this module.
+
+Plugins add their own enhancers with ``register_enhancer``; the function must
+take a 2-D uint8 array as its first argument and its parameters as keywords.
+Bound enhancers also accept RGB arrays, which they enhance on the luma plane
+only (see colour.py).
+An optional ``tuner`` target picks parameters from a 256-bin histogram and
+returns an object with a ``params`` dict (see autotune.py). Point enhancers
+name a ``table`` target as well: given the whole image's histogram and the
+parameters it returns the lookup table the enhancer maps pixels through, so
+any part of the image can be enhanced consistently on its own (see viewer.py).
+Tables that only use the histogram's length (its bit depth) are declared with
+``table_histogram=False``, which lets callers skip counting the pixels.
+"""
+import importlib
+import importlib.util
+import threading
+from collections import namedtuple
+
+# A slider over [minimum, maximum] in steps of ``step``, or a drop-down of ``choices``
+# when given; ``parse`` turns the widget's value into the keyword argument
+Param = namedtuple("Param", "name label default minimum maximum step choices parse",
+                   defaults=(None, None, None, None, float))
+
+
+class Enhancer:
+    def __init__(self, name, label, target, params=(), requires=(), title=None, tuner=None, table=None,
+                 table_histogram=True):
+        self.name = name
+        self.label = label
+        self.target = target
+        self.tuner = tuner
+        self.table = table
+        self.table_histogram = table_histogram
+        self.params = tuple(params)
+        self.requires = tuple(requires)
+        self.title = title or f"{label} Image"
+        self._func = None
+        self._lock = threading.Lock()
+
+    def __repr__(self):
+        return f"Enhancer({self.name!r}, {self.target!r})"
+
+    def available(self):
+        """True when every declared dependency can be imported (without importing it)."""
+        return all(importlib.util.find_spec(module) is not None for module in self.requires)
+
+    def load(self):
+        """Import the implementation on first use and return it."""
+        if self._func is None:
+            with self._lock:
+                if self._func is None:
+                    self._func = _resolve(self.target)
+        return self._func
+
+    def tune(self, histogram):
+        """Parameters the tuner picks for an image with this histogram."""
+        if self.tuner is None:
+            raise ValueError(f"{self.name} has no tuner")
+        return _resolve(self.tuner)(histogram).params
+
+    def build_table(self, histogram, **params):
+        """Lookup table for an image with this histogram, or None for enhancers that are not point operations."""
+        if self.table is None:
+            return None
+        return _resolve(self.table)(histogram, **{**self.defaults(), **params})
+
+    def defaults(self):
+        return {param.name: param.parse(param.default) for param in self.params}
+
+    def bind(self, **params):
+        """Return ``image_array -> enhanced`` with the given parameters (defaults for the rest)."""
+        func = self.load()
+        params = {**self.defaults(), **params}
+
+        def enhance(image_array):
+            if image_array.ndim == 3:
+                from colour import enhance_luma
+                return enhance_luma(image_array, lambda luma: func(luma, **params))
+            return func(image_array, **params)
+
+        return enhance
+
+    def __call__(self, image_array, **params):
+        return self.bind(**params)(image_array)
+
+
+def _resolve(target):
+    module_name, _, attribute = target.partition(":")
+    return getattr(importlib.import_module(module_name), attribute)
+
+
+ENHANCERS = {}
+
+
+def register_enhancer(name, label, target, params=(), requires=(), title=None, tuner=None, table=None,
+                      table_histogram=True):
+    """Add an enhancer to the registry; registering an existing name replaces it."""
+    enhancer = ENHANCERS[name] = Enhancer(name, label, target, params, requires, title, tuner, table,
+                                          table_histogram)
+    return enhancer
+
+
+def get_enhancer(name):
+    try:
+        return ENHANCERS[name]
+    except KeyError:
+        raise ValueError(f"Unknown enhancer: {name}") from None
+
+
+def iter_enhancers(available_only=False):
+    """Registered enhancers in registration order."""
+    return [enhancer for enhancer in ENHANCERS.values() if not available_only or enhancer.available()]
+
+
+def _tile_grid_size(text):
+    from clahe import parse_tile_grid_size
+    return parse_tile_grid_size(text)
+
+
+register_enhancer("pdf", "PDF Enhancement", "stats:pdf_enhancement", title="PDF Enhanced Image",
+                  table="stats:pdf_table")
+register_enhancer("cdf", "CDF Enhancement", "stats:cdf_enhancement", title="CDF Enhanced Image",
+                  table="stats:cdf_table")
+register_enhancer("contrast", "Contrast Adjustment", "NEW:contrast_adjustment", params=(
+    Param("alpha", "Contrast (Alpha)", 2.5, 0.1, 5.0, 0.1),
+    Param("beta", "Brightness (Beta)", 1.5, 0.1, 3.0, 0.1),
+), title="Contrast Adjusted Image", tuner="autotune:tune_contrast", table="lut:contrast_lut", table_histogram=False)
+register_enhancer("gamma", "Gamma Correction", "NEW:gamma_correction", params=(
+    Param("gamma", "Gamma", 2.2, 0.1, 5.0, 0.1),
+), title="Gamma Corrected Image", tuner="autotune:tune_gamma", table="lut:gamma_lut", table_histogram=False)
+register_enhancer("multi_scale", "Multi-Scale Enhancement", "NEW:multi_scale_enhancement", params=(
+    Param("clip_limit", "Clip Limit", "3.5", choices=("1.0", "2.0", "3.0", "3.5", "4.0", "5.0")),
+    Param("tile_grid_size", "Tile Grid Size", "(10, 10)",
+          choices=("(2,2)", "(8, 8)", "(10, 10)", "(12, 12)", "(14, 14)"), parse=_tile_grid_size),
+), requires=("cv2",), title="Multi-Scale Enhanced Image")
@@ -0,0 +1,387 @@
+"""Local HTTP enhancement service.
+
+A small asyncio HTTP/1.1 server around the registered enhancers (see
+registry.py), using only the standard library so it runs offline on one box.
+
+    POST /enhance?enhancer=gamma&gamma=1.8&format=png&quality=90
+        Body: the encoded input image. Returns the encoded result.
+    GET /metrics
+        JSON with request counts, latency percentiles, queue depth and batching.
+    GET /health
+
+Decoding, enhancing and encoding run in a bounded process pool. Requests wait
+in a bounded queue for a free worker and are rejected with 429 once it is full.
+Small uploads arriving within a few milliseconds of each other are sent to a
+worker together, so a burst of thumbnails costs one round trip instead of one
+per image.
+
+Usage:
+    python service.py [--port 8080] [--workers N] [--queue-size 64]
+Load test with:
+    python loadtest.py --url http://127.0.0.1:8080
+"""
+import argparse
+import asyncio
+import io
+import json
+import math
+import multiprocessing
+import os
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from urllib.parse import urlsplit, parse_qsl
+
+import numpy as np
+
+from registry import ENHANCERS
+
+DEFAULT_PORT = 8080
+DEFAULT_QUEUE_SIZE = 64
+
+# Uploads up to this size may share a worker call with others
+SMALL_REQUEST_BYTES = 256 * 1024
+BATCH_WINDOW_MS = 5
+MAX_BATCH = 16
+
+MAX_BODY_BYTES = 64 * 1024 * 1024
+MAX_HEADER_BYTES = 16 * 1024
+
+# Latencies kept for the percentiles in /metrics
+LATENCY_WINDOW = 10000
+
+CONTENT_TYPES = {"PNG": "image/png", "JPEG": "image/jpeg", "WEBP": "image/webp", "TIFF": "image/tiff",
+                 "BMP": "image/bmp"}
+
+REASONS = {200: "OK", 400: "Bad Request", 404: "Not Found", 405: "Method Not Allowed",
+           413: "Payload Too Large", 429: "Too Many Requests", 500: "Internal Server Error"}
+
+
+def _warm_worker():
+    # Import the enhancement stack when the worker starts instead of inside the first request
+    import image_io, NEW, stats
+    from PIL import Image
+
+
+def enhance_batch(requests):
+    """Decode, enhance and encode each (data, enhancer, params, format, quality); runs in a worker process.
+
+    Returns one (status, payload) per request, where the payload is the
+    encoded result or an error message.
+    """
+    from image_io import decode_image, encode_image
+    from registry import get_enhancer
+
+    results = []
+    for data, enhancer, params, image_format, quality in requests:
+        try:
+            image_array = get_enhancer(enhancer)(decode_image(io.BytesIO(data)), **params)
+            output = io.BytesIO()
+            encode_image(image_array, output, image_format, quality)
+            results.append((200, output.getvalue()))
+        except (ValueError, OSError) as e:
+            # PIL reports undecodable uploads as OSError subclasses
+            results.append((400, str(e).encode()))
+        except Exception as e:
+            # Anything else (cv2.error, decompression bombs, MemoryError) fails this request
+            # only, not the rest of its batch
+            results.append((500, f"{type(e).__name__}: {e}".encode()))
+    return results
+
+
+class HTTPError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+class BadLength(HTTPError):
+    def __init__(self, value):
+        super().__init__(400, f"Invalid Content-Length: {value!r}")
+
+
+def parse_content_length(value):
+    """The non-negative integer of a Content-Length header; ``BadLength`` otherwise."""
+    # Digits only: int() would also take signs, spaces and underscores
+    if not (value.isascii() and value.isdigit()):
+        raise BadLength(value)
+    return int(value)
+
+
+class _Job:
+    __slots__ = ("request", "size", "future")
+
+    def __init__(self, request, size, future):
+        self.request = request
+        self.size = size
+        self.future = future
+
+
+class EnhancementService:
+    def __init__(self, workers=None, queue_size=DEFAULT_QUEUE_SIZE, batch_window_ms=BATCH_WINDOW_MS,
+                 max_batch=MAX_BATCH):
+        self.workers = workers or os.cpu_count() or 1
+        self.queue_size = queue_size
+        self.batch_window = batch_window_ms / 1000
+        self.max_batch = max_batch
+        self._executor = None
+        self._pending = deque()
+        self._wakeup = None
+        self._slots = None
+        self._dispatcher = None
+        self._batch_tasks = set()
+        self._started = time.monotonic()
+        self.in_flight = 0
+        self.latencies = deque(maxlen=LATENCY_WINDOW)
+        self.status_counts = {}
+        self.batches = 0
+        self.batched_requests = 0
+
+    def _start_workers(self):
+        # Spawned rather than forked: workers start on demand, and a forked worker would inherit the
+        # sockets of open connections and keep them from closing
+        self._executor = ProcessPoolExecutor(max_workers=self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                             initializer=_warm_worker)
+
+    async def start(self, host="127.0.0.1", port=DEFAULT_PORT):
+        self._start_workers()
+        self._wakeup = asyncio.Event()
+        self._slots = asyncio.Semaphore(self.workers)
+        self._dispatcher = asyncio.create_task(self._dispatch())
+        return await asyncio.start_server(self._handle_connection, host, port, limit=MAX_HEADER_BYTES)
+
+    def close(self):
+        if self._dispatcher is not None:
+            self._dispatcher.cancel()
+        if self._executor is not None:
+            self._executor.shutdown(cancel_futures=True)
+
+    def submit(self, request, size):
+        """Queue one request and return a future of its (status, payload); 429 when the queue is full."""
+        if len(self._pending) >= self.queue_size:
+            raise HTTPError(429, "Queue full, retry later")
+        job = _Job(request, size, asyncio.get_running_loop().create_future())
+        self._pending.append(job)
+        self._wakeup.set()
+        return job.future
+
+    async def _next_job(self, timeout=None):
+        while not self._pending:
+            self._wakeup.clear()
+            if timeout is None:
+                await self._wakeup.wait()
+            else:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+        return self._pending.popleft()
+
+    async def _dispatch(self):
+        # Take a worker slot first, so requests queue here (and count towards 429s) rather than in the pool
+        loop = asyncio.get_running_loop()
+        while True:
+            await self._slots.acquire()
+            batch = [await self._next_job()]
+            if batch[0].size <= SMALL_REQUEST_BYTES:
+                deadline = loop.time() + self.batch_window
+                while len(batch) < self.max_batch:
+                    if self._pending:
+                        if self._pending[0].size > SMALL_REQUEST_BYTES:
+                            break  # A large upload gets a worker call of its own
+                        batch.append(self._pending.popleft())
+                        continue
+                    remaining = deadline - loop.time()
+                    if remaining <= 0:
+                        break
+                    try:
+                        batch.append(await self._next_job(remaining))
+                    except asyncio.TimeoutError:
+                        break
+            task = asyncio.create_task(self._run_batch(batch))
+            self._batch_tasks.add(task)
+            task.add_done_callback(self._batch_tasks.discard)
+
+    async def _run_batch(self, batch):
+        self.in_flight += len(batch)
+        self.batches += 1
+        self.batched_requests += len(batch)
+        executor = self._executor
+        try:
+            results = await asyncio.get_running_loop().run_in_executor(
+                executor, enhance_batch, [job.request for job in batch])
+        except BrokenProcessPool as e:
+            # A worker died (killed, out of memory): fail this batch and start a fresh pool for the
+            # next ones, unless a batch that broke at the same time already did
+            results = [(500, f"Worker process failed: {e}".encode())] * len(batch)
+            if self._executor is executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+                self._start_workers()
+        except Exception as e:
+            results = [(500, str(e).encode())] * len(batch)
+        finally:
+            self.in_flight -= len(batch)
+            self._slots.release()
+        for job, result in zip(batch, results):
+            if not job.future.done():
+                job.future.set_result(result)
+
+    async def _handle_connection(self, reader, writer):
+        try:
+            while True:
+                try:
+                    head = await reader.readuntil(b"\r\n\r\n")
+                except (asyncio.IncompleteReadError, ConnectionError):
+                    break
+                except asyncio.LimitOverrunError:
+                    await self._respond(writer, 400, b"Header too large", close=True)
+                    break
+                keep_alive = await self._handle_request(head, reader, writer)
+                if not keep_alive:
+                    break
+        finally:
+            writer.close()
+
+    async def _handle_request(self, head, reader, writer):
+        start = time.perf_counter()
+        lines = head.decode("latin-1").split("\r\n")
+        try:
+            method, target, version = lines[0].split(" ", 2)
+        except ValueError:
+            await self._respond(writer, 400, b"Malformed request line", close=True)
+            return False
+        headers = {}
+        for line in lines[1:]:
+            name, _, value = line.partition(":")
+            if name:
+                headers[name.strip().lower()] = value.strip()
+        connection = headers.get("connection", "").lower()
+        keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+
+        url = urlsplit(target)
+        try:
+            length = parse_content_length(headers.get("content-length", "0"))
+            if length > MAX_BODY_BYTES:
+                raise HTTPError(413, f"Uploads are limited to {MAX_BODY_BYTES} bytes")
+            body = await reader.readexactly(length) if length else b""
+
+            if url.path == "/enhance":
+                if method != "POST":
+                    raise HTTPError(405, "Use POST")
+                status, payload, content_type = await self._enhance(url.query, body)
+            elif url.path == "/metrics" and method == "GET":
+                status, payload, content_type = 200, json.dumps(self.metrics()).encode(), "application/json"
+            elif url.path == "/health" and method == "GET":
+                status, payload, content_type = 200, b"ok", "text/plain"
+            else:
+                raise HTTPError(404, "Not found")
+        except HTTPError as e:
+            status, payload, content_type = e.status, str(e).encode(), "text/plain"
+            # Without a usable length the rest of the body cannot be skipped
+            keep_alive = keep_alive and e.status != 413 and not isinstance(e, BadLength)
+        except asyncio.IncompleteReadError:
+            return False
+
+        self.status_counts[status] = self.status_counts.get(status, 0) + 1
+        if url.path == "/enhance" and status == 200:
+            self.latencies.append(time.perf_counter() - start)
+        await self._respond(writer, status, payload, content_type, close=not keep_alive)
+        return keep_alive
+
+    async def _enhance(self, query, body):
+        if not body:
+            raise HTTPError(400, "Send the image as the request body")
+        request = parse_enhance_query(query, body)
+        status, payload = await self.submit(request, len(body))
+        if status != 200:
+            return status, payload, "text/plain"
+        return status, payload, CONTENT_TYPES.get(request[3], "application/octet-stream")
+
+    async def _respond(self, writer, status, payload, content_type="text/plain", close=False):
+        head = [f"HTTP/1.1 {status} {REASONS.get(status, '')}", f"Content-Type: {content_type}",
+                f"Content-Length: {len(payload)}", f"Connection: {'close' if close else 'keep-alive'}"]
+        if status == 429:
+            head.append("Retry-After: 1")
+        writer.write(("\r\n".join(head) + "\r\n\r\n").encode("latin-1") + payload)
+        try:
+            await writer.drain()
+        except ConnectionError:
+            pass
+
+    def metrics(self):
+        latencies = np.array(self.latencies) * 1000
+        percentiles = np.percentile(latencies, [50, 90, 99]) if latencies.size else [0.0, 0.0, 0.0]
+        return {
+            "uptime_s": time.monotonic() - self._started,
+            "workers": self.workers,
+            "queue_depth": len(self._pending),
+            "queue_size": self.queue_size,
+            "in_flight": self.in_flight,
+            "requests": sum(self.status_counts.values()),
+            "status": {str(status): count for status, count in sorted(self.status_counts.items())},
+            "latency_ms": {"p50": float(percentiles[0]), "p90": float(percentiles[1]),
+                           "p99": float(percentiles[2]), "samples": int(latencies.size)},
+            "batches": self.batches,
+            "mean_batch_size": self.batched_requests / self.batches if self.batches else 0.0,
+        }
+
+
+def parse_enhance_query(query, body):
+    """Validate the query string of /enhance into a worker request tuple."""
+    from image_io import DEFAULT_QUALITY, OUTPUT_FORMATS
+
+    fields = dict(parse_qsl(query))
+    name = fields.pop("enhancer", None)
+    if name not in ENHANCERS:
+        raise HTTPError(400, f"enhancer must be one of: {', '.join(ENHANCERS)}")
+    extension = "." + fields.pop("format", "png").lower().lstrip(".")
+    if extension not in OUTPUT_FORMATS:
+        raise HTTPError(400, f"Unsupported format: {extension[1:]}")
+    try:
+        quality = int(fields.pop("quality", DEFAULT_QUALITY))
+    except ValueError:
+        raise HTTPError(400, "quality must be an integer") from None
+
+    declared = {param.name: param for param in ENHANCERS[name].params}
+    params = {}
+    for key, value in fields.items():
+        if key not in declared:
+            raise HTTPError(400, f"Unknown parameter for {name}: {key}")
+        try:
+            params[key] = declared[key].parse(value)
+        except ValueError as e:
+            raise HTTPError(400, f"Invalid {key}: {e}") from None
+        if isinstance(params[key], float) and not math.isfinite(params[key]):
+            raise HTTPError(400, f"Invalid {key}: must be a finite number")
+    return body, name, params, OUTPUT_FORMATS[extension], quality
+
+
+async def serve(host, port, **options):
+    service = EnhancementService(**options)
+    server = await service.start(host, port)
+    print(f"Serving on http://{host}:{port} with {service.workers} workers")
+    try:
+        async with server:
+            await server.serve_forever()
+    finally:
+        service.close()
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="HTTP service for the image enhancers.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--queue-size", type=int, default=DEFAULT_QUEUE_SIZE,
+                        help="Requests waiting for a worker before new ones get 429 (default: 64)")
+    parser.add_argument("--batch-window-ms", type=float, default=BATCH_WINDOW_MS,
+                        help="How long a small request waits for company (default: 5)")
+    parser.add_argument("--max-batch", type=int, default=MAX_BATCH)
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.host, args.port, workers=args.workers, queue_size=args.queue_size,
+                          batch_window_ms=args.batch_window_ms, max_batch=args.max_batch))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+"""Vectorized enhancement of (N, H, W) uint8 image stacks.
+
+Each function here is the batched form of the NEW.py step with the same name
+pattern and gives the same result as calling that step once per image, without
+a Python loop over the stack. Histograms are counted in one bincount by
+offsetting every image's pixel values into its own 256-bin range, and per-image
+tables are applied with one gather into the flattened N x 256 table array.
+"""
+import numpy as np
+
+from lut import build_lut
+
+# Pixels handled per vectorized call, bounds the intp index temporaries
+STACK_CHUNK = 1 << 22
+
+
+def _check_stack(stack):
+    if not isinstance(stack, np.ndarray) or stack.ndim != 3 or stack.dtype != np.uint8:
+        raise ValueError("Input must be an (N, H, W) uint8 numpy array.")
+
+
+def _image_chunks(stack):
+    # Groups of whole images with at most STACK_CHUNK pixels (and at least one image);
+    # an empty stack has none
+    if stack.shape[0] == 0:
+        return
+    per_chunk = max(1, STACK_CHUNK // max(stack[0].size, 1))
+    for start in range(0, stack.shape[0], per_chunk):
+        yield start, min(start + per_chunk, stack.shape[0])
+
+
+def compute_histograms(stack):
+    _check_stack(stack)
+    n = stack.shape[0]
+    histograms = np.empty((n, 256), dtype=np.int64)
+    for start, stop in _image_chunks(stack):
+        chunk = stack[start:stop].reshape(stop - start, -1)
+        offsets = (np.arange(stop - start, dtype=np.intp) * 256)[:, None]
+        counts = np.bincount((chunk + offsets).ravel(), minlength=(stop - start) * 256)
+        histograms[start:stop] = counts.reshape(stop - start, 256)
+    return histograms
+
+
+def compute_pdfs(histograms):
+    total_pixels = np.sum(histograms, axis=1, keepdims=True)
+    return histograms / total_pixels
+
+
+def compute_mean_and_average_pdfs(pdfs):
+    mean_pdfs = np.mean(pdfs, axis=1, keepdims=True)
+    average_pdfs = np.sum(pdfs, axis=1, keepdims=True) / pdfs.shape[1]
+    return mean_pdfs, average_pdfs
+
+
+def compute_adaptive_pdfs(pdfs, mean_pdfs, average_pdfs):
+    return np.where(pdfs < average_pdfs, average_pdfs, pdfs / mean_pdfs)
+
+
+def compute_pdf_luts(adaptive_pdfs):
+    cdfs = np.cumsum(adaptive_pdfs, axis=1)
+    return np.floor(cdfs * 255 / cdfs[:, -1:]).astype(np.uint8)
+
+
+def compute_cdfs(histograms):
+    cdfs = np.cumsum(histograms, axis=1)
+    return cdfs / cdfs[:, -1:]
+
+
+def compute_mean_and_average_cdfs(cdfs):
+    mean_cdfs = np.mean(cdfs, axis=1, keepdims=True)
+    average_cdfs = np.sum(cdfs, axis=1, keepdims=True) / cdfs.shape[1]
+    return mean_cdfs, average_cdfs
+
+
+def compute_adaptive_cdfs(cdfs, mean_cdfs, average_cdfs, gamma=2):
+    # Same power-law stretch as NEW.compute_adaptive_cdf, row by row; gamma may be an (N, 1) column
+    enhanced_cdfs = np.power(cdfs, gamma)
+    min_cdfs = np.min(enhanced_cdfs, axis=1, keepdims=True)
+    max_cdfs = np.max(enhanced_cdfs, axis=1, keepdims=True)
+    enhanced_cdfs = (enhanced_cdfs - min_cdfs) / (max_cdfs - min_cdfs)
+    return np.where(enhanced_cdfs > average_cdfs, enhanced_cdfs, enhanced_cdfs - average_cdfs + mean_cdfs)
+
+
+def compute_cdf_luts(adaptive_cdfs):
+    min_vals = np.min(adaptive_cdfs, axis=1, keepdims=True)
+    max_vals = np.max(adaptive_cdfs, axis=1, keepdims=True)
+    flat = max_vals == min_vals  # Rows that NEW.compute_cdf_lut maps to all zeros
+    with np.errstate(divide="ignore", invalid="ignore"):
+        normalized = (adaptive_cdfs - min_vals) / (max_vals - min_vals)
+    normalized = np.where(flat, 0.0, normalized)
+    return np.floor(normalized * 255).astype(np.uint8)
+
+
+def apply_luts(stack, luts):
+    """Map image ``i`` of the stack through row ``i`` of an (N, 256) table array."""
+    _check_stack(stack)
+    if luts.shape != (stack.shape[0], 256):
+        raise ValueError("Expected one 256-entry table per image.")
+    flat_luts = luts.ravel()
+    out = np.empty_like(stack)
+    for start, stop in _image_chunks(stack):
+        offsets = (np.arange(start, stop, dtype=np.intp) * 256)[:, None, None]
+        np.take(flat_luts, stack[start:stop] + offsets, out=out[start:stop])
+    return out
+
+
+def enhance_stack_with_pdf(stack):
+    histograms = compute_histograms(stack)
+    pdfs = compute_pdfs(histograms)
+    adaptive_pdfs = compute_adaptive_pdfs(pdfs, *compute_mean_and_average_pdfs(pdfs))
+    return apply_luts(stack, compute_pdf_luts(adaptive_pdfs))
+
+
+def enhance_stack_with_cdf(stack):
+    histograms = compute_histograms(stack)
+    cdfs = compute_cdfs(histograms)
+    adaptive_cdfs = compute_adaptive_cdfs(cdfs, *compute_mean_and_average_cdfs(cdfs))
+    return apply_luts(stack, compute_cdf_luts(adaptive_cdfs))
+
+
+def contrast_adjustment_stack(stack, alpha=2.5, beta=1.5):
+    _check_stack(stack)
+    return build_lut("contrast", alpha, beta)[stack]
+
+
+def gamma_correction_stack(stack, gamma=2.2):
+    _check_stack(stack)
+    return build_lut("gamma", gamma)[stack]
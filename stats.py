@@ -0,0 +1,126 @@
+"""Histogram analysis shared by the PDF and CDF enhancers.
+
+An ``ImageStats`` is built from a single counting pass over the image and
+derives everything the PDF/CDF steps in NEW.py need from the 256-bin histogram,
+so re-enhancing an image that was already analysed costs one gather.
+"""
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import cached_property
+
+import numpy as np
+
+from NEW import (
+    compute_histogram, compute_pdf, compute_mean_and_average_pdf, compute_adaptive_pdf,
+    compute_pdf_lut, compute_cdf, compute_mean_and_average_cdf, compute_adaptive_cdf,
+    compute_cdf_lut
+)
+
+STATS_CACHE_SIZE = 8
+
+
+def image_fingerprint(image_array):
+    """Content fingerprint of an image: shape, dtype and a hash of the pixels."""
+    digest = hashlib.blake2b(digest_size=16)
+    digest.update(str((image_array.shape, image_array.dtype.str)).encode())
+    digest.update(np.ascontiguousarray(image_array).data)
+    return digest.hexdigest()
+
+
+class ImageStats:
+    """Histogram and the PDF/CDF figures derived from it, computed lazily."""
+
+    def __init__(self, histogram, fingerprint=None):
+        self.histogram = histogram
+        self.fingerprint = fingerprint
+
+    @classmethod
+    def from_image(cls, image_array, fingerprint=None):
+        return cls(compute_histogram(image_array), fingerprint)
+
+    @property
+    def total_pixels(self):
+        return int(self.histogram.sum())
+
+    @cached_property
+    def pdf(self):
+        return compute_pdf(self.histogram)
+
+    @cached_property
+    def mean_and_average_pdf(self):
+        return compute_mean_and_average_pdf(self.pdf)
+
+    @cached_property
+    def adaptive_pdf(self):
+        return compute_adaptive_pdf(self.pdf, *self.mean_and_average_pdf)
+
+    @cached_property
+    def pdf_lut(self):
+        return compute_pdf_lut(self.adaptive_pdf)
+
+    @cached_property
+    def cdf(self):
+        return compute_cdf(self.histogram)
+
+    @cached_property
+    def mean_and_average_cdf(self):
+        return compute_mean_and_average_cdf(self.cdf)
+
+    @cached_property
+    def adaptive_cdf(self):
+        return compute_adaptive_cdf(self.cdf, *self.mean_and_average_cdf)
+
+    @cached_property
+    def cdf_lut(self):
+        return compute_cdf_lut(self.adaptive_cdf)
+
+    @cached_property
+    def mean_intensity(self):
+        return float(np.dot(np.arange(self.histogram.size), self.histogram) / self.total_pixels)
+
+
+_stats_cache = OrderedDict()
+_stats_lock = threading.Lock()
+
+
+def get_image_stats(image_array):
+    """Return the ``ImageStats`` of an image, reusing it for identical content."""
+    key = image_fingerprint(image_array)
+    with _stats_lock:
+        stats = _stats_cache.get(key)
+        if stats is not None:
+            _stats_cache.move_to_end(key)
+            return stats
+
+    stats = ImageStats.from_image(image_array, key)
+    with _stats_lock:
+        _stats_cache[key] = stats
+        if len(_stats_cache) > STATS_CACHE_SIZE:
+            _stats_cache.popitem(last=False)
+    return stats
+
+
+def clear_stats_cache():
+    with _stats_lock:
+        _stats_cache.clear()
+
+
+def pdf_enhancement(image_array):
+    """Adaptive PDF enhancement; repeat calls on the same image only do the gather."""
+    return get_image_stats(image_array).pdf_lut[image_array]
+
+
+def cdf_enhancement(image_array):
+    """Adaptive CDF enhancement; repeat calls on the same image only do the gather."""
+    return get_image_stats(image_array).cdf_lut[image_array]
+
+
+def pdf_table(histogram):
+    """The table ``pdf_enhancement`` maps an image with this histogram through."""
+    return ImageStats(histogram).pdf_lut
+
+
+def cdf_table(histogram):
+    """The table ``cdf_enhancement`` maps an image with this histogram through."""
+    return ImageStats(histogram).cdf_lut
@@ -0,0 +1,124 @@
+"""Out-of-core enhancement for images too large to hold in memory.
+
+The global enhancers (PDF, CDF, contrast, gamma) are point operations driven by
+a whole-image histogram, so they can run in two passes over row bands of a
+memory-mapped image: pass one accumulates the histogram, pass two maps each
+band through the resulting lookup table into a memory-mapped output. Only one
+band is resident at a time, so peak memory follows ``tile_bytes`` rather than
+the image size.
+
+Usage:
+    python tiled.py INPUT.npy OUTPUT.npy --enhancer cdf [--tile-mb 64]
+    python tiled.py INPUT.raw OUTPUT.raw --shape 80000x60000 --enhancer pdf
+"""
+import argparse
+import os
+
+import numpy as np
+
+from NEW import compute_histogram
+from lut import build_lut, apply_lut
+from stats import ImageStats
+
+DEFAULT_TILE_BYTES = 64 * 1024 * 1024
+
+TILED_ENHANCERS = ("pdf", "cdf", "contrast", "gamma")
+
+
+def open_image_memmap(path, shape=None, dtype=np.uint8):
+    """Memory-map a ``.npy`` file, or a raw file of the given ``(height, width)``."""
+    if path.lower().endswith(".npy"):
+        return np.load(path, mmap_mode="r")
+    if shape is None:
+        raise ValueError("Raw input needs an explicit (height, width) shape.")
+    return np.memmap(path, dtype=dtype, mode="r", shape=shape)
+
+
+def create_output_memmap(path, shape, dtype=np.uint8):
+    """Create a writable memory-mapped ``.npy`` or raw output file."""
+    if path.lower().endswith(".npy"):
+        return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+    return np.memmap(path, dtype=dtype, mode="w+", shape=shape)
+
+
+def iter_row_bands(image_array, tile_bytes=DEFAULT_TILE_BYTES):
+    """Yield row slices whose band of ``image_array`` fits in ``tile_bytes``."""
+    row_bytes = max(image_array[0].nbytes, 1)
+    rows = max(1, tile_bytes // row_bytes)
+    for start in range(0, image_array.shape[0], rows):
+        yield slice(start, min(start + rows, image_array.shape[0]))
+
+
+def tiled_histogram(image_array, tile_bytes=DEFAULT_TILE_BYTES):
+    """Pass one: accumulate the 256-bin histogram band by band."""
+    histogram = np.zeros(256, dtype=np.int64)
+    for rows in iter_row_bands(image_array, tile_bytes):
+        histogram += compute_histogram(np.asarray(image_array[rows]))
+    return histogram
+
+
+def tiled_apply_lut(image_array, table, out, tile_bytes=DEFAULT_TILE_BYTES):
+    """Pass two: map each band through ``table`` straight into ``out``.
+
+    ``apply_lut`` gathers in fixed-size chunks, so the index temporary stays
+    small instead of growing to eight bytes per pixel of the band.
+    """
+    for rows in iter_row_bands(image_array, tile_bytes):
+        apply_lut(image_array[rows], table, out[rows])
+    return out
+
+
+def build_tiled_lut(image_array, enhancer, tile_bytes=DEFAULT_TILE_BYTES, **params):
+    """Return the 256-entry table that ``enhancer`` applies to the whole image."""
+    if enhancer == "contrast":
+        return build_lut("contrast", params.get("alpha", 2.5), params.get("beta", 1.5))
+    if enhancer == "gamma":
+        return build_lut("gamma", params.get("gamma", 2.2))
+
+    stats = ImageStats(tiled_histogram(image_array, tile_bytes))
+    if enhancer == "pdf":
+        return stats.pdf_lut
+    if enhancer == "cdf":
+        return stats.cdf_lut
+    raise ValueError(f"Unsupported tiled enhancer: {enhancer}")
+
+
+def enhance_tiled(input_path, output_path, enhancer, tile_bytes=DEFAULT_TILE_BYTES, shape=None, **params):
+    """Enhance a memory-mapped image file into a memory-mapped output file."""
+    image_array = open_image_memmap(input_path, shape)
+    if image_array.dtype != np.uint8 or image_array.ndim != 2:
+        raise ValueError("Tiled mode supports 2-D uint8 images only.")
+
+    table = build_tiled_lut(image_array, enhancer, tile_bytes, **params)
+    out = create_output_memmap(output_path, image_array.shape)
+    tiled_apply_lut(image_array, table, out, tile_bytes)
+    out.flush()
+    return out
+
+
+def _parse_shape(text):
+    height, width = (int(value) for value in text.lower().split("x"))
+    return height, width
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Two-pass tiled enhancement of memory-mapped images.")
+    parser.add_argument("input", help="Input .npy file or raw uint8 file")
+    parser.add_argument("output", help="Output .npy or raw file")
+    parser.add_argument("--enhancer", choices=TILED_ENHANCERS, required=True)
+    parser.add_argument("--shape", type=_parse_shape, help="HEIGHTxWIDTH of a raw input")
+    parser.add_argument("--tile-mb", type=float, default=DEFAULT_TILE_BYTES / (1024 * 1024),
+                        help="Memory budget per band in MB (default: 64)")
+    parser.add_argument("--alpha", type=float, default=2.5)
+    parser.add_argument("--beta", type=float, default=1.5)
+    parser.add_argument("--gamma", type=float, default=2.2)
+    args = parser.parse_args(argv)
+
+    if os.path.abspath(args.input) == os.path.abspath(args.output):
+        parser.error("Output must be a different file from the input.")
+    enhance_tiled(args.input, args.output, args.enhancer, int(args.tile_mb * 1024 * 1024), args.shape,
+                  alpha=args.alpha, beta=args.beta, gamma=args.gamma)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,279 @@
+"""Streaming PDF/CDF enhancement of video files and image sequences.
+
+Frames flow through three threads joined by bounded queues: decode, enhance
+and encode. The enhancer keeps an exponentially smoothed histogram across
+frames and only rebuilds its lookup table when the distribution has drifted
+past a threshold, which both avoids flicker and keeps per-frame work down to
+one histogram count and one gather.
+
+Usage:
+    python video.py INPUT OUTPUT --enhancer cdf [--smoothing 0.1] [--threshold 0.02]
+
+INPUT is a video file, a directory of frames or a glob pattern. OUTPUT is a
+video file (.mp4/.avi) or a directory that receives numbered PNG frames.
+"""
+import argparse
+import glob
+import os
+import queue
+import threading
+import time
+
+import cv2
+import numpy as np
+
+from NEW import compute_histogram
+from stats import ImageStats
+
+VIDEO_EXTENSIONS = (".mp4", ".avi", ".mov", ".mkv", ".m4v")
+FRAME_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".tif", ".tiff")
+
+_END = object()
+
+
+class StageMeter:
+    """Frame count and busy time of one pipeline stage."""
+
+    def __init__(self, name):
+        self.name = name
+        self.frames = 0
+        self.busy = 0.0
+
+    def record(self, seconds):
+        self.frames += 1
+        self.busy += seconds
+
+    @property
+    def fps(self):
+        return self.frames / self.busy if self.busy else 0.0
+
+    def __repr__(self):
+        return f"{self.name}: {self.frames} frames, {self.fps:.1f} fps"
+
+
+class TemporalHistogram:
+    """Running, exponentially smoothed histogram with a drift-gated lookup table.
+
+    ``smoothing`` is the weight of the newest frame (1.0 disables smoothing).
+    The table is rebuilt when the total variation distance between the
+    smoothed distribution and the one the table was built from exceeds
+    ``threshold``.
+    """
+
+    def __init__(self, enhancer="cdf", smoothing=0.1, threshold=0.02):
+        if enhancer not in ("pdf", "cdf"):
+            raise ValueError("Streaming mode supports the 'pdf' and 'cdf' enhancers.")
+        if not 0 < smoothing <= 1:
+            raise ValueError("smoothing must be in (0, 1].")
+        self.enhancer = enhancer
+        self.smoothing = smoothing
+        self.threshold = threshold
+        self.histogram = None
+        self.table = None
+        self.rebuilds = 0
+        self._table_distribution = None
+
+    def update(self, frame):
+        """Fold ``frame`` into the running histogram and return the current table."""
+        histogram = compute_histogram(frame).astype(np.float64)
+        if self.histogram is None:
+            self.histogram = histogram
+        else:
+            self.histogram *= 1 - self.smoothing
+            self.histogram += self.smoothing * histogram
+
+        distribution = self.histogram / self.histogram.sum()
+        if self.table is None or 0.5 * np.abs(distribution - self._table_distribution).sum() > self.threshold:
+            stats = ImageStats(self.histogram.copy())
+            self.table = stats.pdf_lut if self.enhancer == "pdf" else stats.cdf_lut
+            self._table_distribution = distribution
+            self.rebuilds += 1
+        return self.table
+
+
+def read_frames(source):
+    """Yield grayscale uint8 frames from a video file, frame directory or glob."""
+    if os.path.isfile(source) and source.lower().endswith(VIDEO_EXTENSIONS):
+        capture = cv2.VideoCapture(source)
+        if not capture.isOpened():
+            raise ValueError(f"Cannot open video: {source}")
+        try:
+            while True:
+                ok, frame = capture.read()
+                if not ok:
+                    break
+                yield cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY) if frame.ndim == 3 else frame
+        finally:
+            capture.release()
+        return
+
+    pattern = os.path.join(source, "*") if os.path.isdir(source) else source
+    paths = sorted(path for path in glob.glob(pattern) if path.lower().endswith(FRAME_EXTENSIONS))
+    if not paths:
+        raise ValueError(f"No video or frames found at: {source}")
+    for path in paths:
+        frame = cv2.imread(path, cv2.IMREAD_GRAYSCALE)
+        if frame is None:
+            raise ValueError(f"Cannot decode frame: {path}")
+        yield frame
+
+
+def enhance_frames(frames, enhancer="cdf", smoothing=0.1, threshold=0.02, tracker=None):
+    """Yield enhanced frames using a temporally smoothed lookup table."""
+    tracker = tracker or TemporalHistogram(enhancer, smoothing, threshold)
+    for frame in frames:
+        yield np.take(tracker.update(frame), frame)
+
+
+class FrameWriter:
+    """Write frames to a video file or to numbered PNGs in a directory."""
+
+    def __init__(self, target, fps=30.0):
+        self.target = target
+        self.fps = fps
+        self.count = 0
+        self._video = None
+        self._is_video = target.lower().endswith(VIDEO_EXTENSIONS)
+        if not self._is_video:
+            os.makedirs(target, exist_ok=True)
+
+    def write(self, frame):
+        if self._is_video:
+            if self._video is None:
+                fourcc = cv2.VideoWriter_fourcc(*("mp4v" if self.target.lower().endswith(".mp4") else "MJPG"))
+                height, width = frame.shape
+                self._video = cv2.VideoWriter(self.target, fourcc, self.fps, (width, height), isColor=False)
+            self._video.write(frame)
+        else:
+            cv2.imwrite(os.path.join(self.target, f"frame_{self.count:06d}.png"), frame)
+        self.count += 1
+
+    def close(self):
+        if self._video is not None:
+            self._video.release()
+
+
+def _metered(iterable, meter):
+    # Time only the work of producing each item, not the wait for the consumer
+    iterator = iter(iterable)
+    while True:
+        start = time.perf_counter()
+        try:
+            item = next(iterator)
+        except StopIteration:
+            return
+        meter.record(time.perf_counter() - start)
+        yield item
+
+
+def _enhance_stage(frames, tracker, meter):
+    for frame in frames:
+        start = time.perf_counter()
+        enhanced = np.take(tracker.update(frame), frame)
+        meter.record(time.perf_counter() - start)
+        yield enhanced
+
+
+def _queue_items(q, stop):
+    while not stop.is_set():
+        try:
+            item = q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+        if item is _END:
+            return
+        yield item
+
+
+def _put(q, item, stop):
+    # Blocking put that gives up once another stage has failed
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _run_stage(items, out_queue, errors, stop):
+    # Pump a generator into a bounded queue; always terminate the queue
+    try:
+        for item in items:
+            if not _put(out_queue, item, stop):
+                return
+    except BaseException as e:
+        errors.append(e)
+        stop.set()
+    _put(out_queue, _END, stop)
+
+
+def run_stream(source, target, enhancer="cdf", smoothing=0.1, threshold=0.02, queue_size=8, fps=None):
+    """Decode, enhance and encode ``source`` into ``target`` on three threads.
+
+    Returns the per-stage ``StageMeter`` objects and the ``TemporalHistogram``.
+    """
+    if fps is None:
+        fps = 30.0
+        if os.path.isfile(source):
+            capture = cv2.VideoCapture(source)
+            fps = capture.get(cv2.CAP_PROP_FPS) or fps
+            capture.release()
+
+    meters = {name: StageMeter(name) for name in ("decode", "enhance", "encode")}
+    tracker = TemporalHistogram(enhancer, smoothing, threshold)
+    decoded = queue.Queue(maxsize=queue_size)
+    enhanced = queue.Queue(maxsize=queue_size)
+    errors = []
+    stop = threading.Event()
+
+    decode_frames = _metered(read_frames(source), meters["decode"])
+    enhance_frames_ = _enhance_stage(_queue_items(decoded, stop), tracker, meters["enhance"])
+    decode_thread = threading.Thread(target=_run_stage, args=(decode_frames, decoded, errors, stop), daemon=True)
+    enhance_thread = threading.Thread(target=_run_stage, args=(enhance_frames_, enhanced, errors, stop), daemon=True)
+    decode_thread.start()
+    enhance_thread.start()
+
+    writer = FrameWriter(target, fps)
+    try:
+        for frame in _queue_items(enhanced, stop):
+            start = time.perf_counter()
+            writer.write(frame)
+            meters["encode"].record(time.perf_counter() - start)
+    except BaseException:
+        stop.set()
+        raise
+    finally:
+        writer.close()
+    decode_thread.join()
+    enhance_thread.join()
+    if errors:
+        raise errors[0]
+    return meters, tracker
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Streaming PDF/CDF enhancement of videos and frame sequences.")
+    parser.add_argument("input", help="Video file, frame directory or glob pattern")
+    parser.add_argument("output", help="Output video file or frame directory")
+    parser.add_argument("--enhancer", choices=("pdf", "cdf"), default="cdf")
+    parser.add_argument("--smoothing", type=float, default=0.1, help="Weight of the newest frame (default: 0.1)")
+    parser.add_argument("--threshold", type=float, default=0.02,
+                        help="Histogram drift that triggers a table rebuild (default: 0.02)")
+    parser.add_argument("--queue-size", type=int, default=8, help="Frames buffered between stages (default: 8)")
+    parser.add_argument("--fps", type=float, default=None, help="Output frame rate (default: input rate or 30)")
+    args = parser.parse_args(argv)
+
+    start = time.perf_counter()
+    meters, tracker = run_stream(args.input, args.output, args.enhancer, args.smoothing, args.threshold,
+                                 args.queue_size, args.fps)
+    elapsed = time.perf_counter() - start
+    for meter in meters.values():
+        print(meter)
+    frames = meters["encode"].frames
+    print(f"{frames} frames in {elapsed:.2f}s ({frames / elapsed if elapsed else 0:.1f} fps end to end), "
+          f"{tracker.rebuilds} table rebuilds")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,257 @@
+"""Tile pyramid, tile cache and viewport maths for the zoom-and-pan viewer.
+
+The image is kept as a pyramid of levels, each half the size of the one
+before, so any zoom level is drawn from at most twice the pixels on screen.
+A view only touches the 256 x 256 tiles that intersect it. Point enhancers
+(PDF, CDF, contrast, gamma) are drawn by gathering each visible tile through
+one table built from whole-image statistics, so every tile agrees with the
+full-resolution result and nothing off screen is enhanced. Enhanced tiles
+are kept in a byte-bounded LRU cache, which makes panning back over visited
+areas free. Enhancers that need their neighbourhood (CLAHE) are rendered
+once at full resolution and viewed through a pyramid of their own.
+
+Nothing here depends on Tk; front.py turns the rendered arrays into images.
+
+Usage:
+    python viewer.py IMAGE [--enhancer pdf] [--zoom 1.0] [--steps 50]
+"""
+import argparse
+import itertools
+import math
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+TILE_SIZE = 256
+TILE_CACHE_BYTES = 256 << 20
+MAX_ZOOM = 8.0
+
+_renderer_keys = itertools.count()
+
+
+def _halve(level):
+    # 2x2 box reduction; PIL's is vectorised for 8-bit images, NumPy covers the rest
+    if level.dtype == np.uint8:
+        from PIL import Image
+
+        return np.asarray(Image.fromarray(level).reduce(2))
+    height, width = level.shape[0] // 2 * 2, level.shape[1] // 2 * 2
+    level = level[:height, :width].astype(np.uint32)
+    summed = level[0::2, 0::2] + level[1::2, 0::2] + level[0::2, 1::2] + level[1::2, 1::2]
+    return ((summed + 2) >> 2).astype(np.uint16)
+
+
+class TilePyramid:
+    """Levels of an image at 1/1, 1/2, 1/4... scale, down to one tile; each is built on first use."""
+
+    def __init__(self, image_array, tile_size=TILE_SIZE):
+        self.tile_size = tile_size
+        self.levels = [image_array]
+        height, width = image_array.shape[:2]
+        self.size = (width, height)
+        self.level_count = 1 + max(0, math.ceil(math.log2(max(width, height) / tile_size)))
+
+    def level(self, index):
+        while len(self.levels) <= index:
+            self.levels.append(_halve(self.levels[-1]))
+        return self.levels[index]
+
+    def build(self):
+        """Build every level now (in a background job, say) so first views do not wait for them."""
+        self.level(self.level_count - 1)
+        return self
+
+    def level_for_zoom(self, zoom):
+        """Coarsest level that still has at least one pixel per screen pixel."""
+        if zoom >= 1:
+            return 0
+        return min(int(math.floor(math.log2(1 / zoom))), self.level_count - 1)
+
+    def tile(self, index, tx, ty):
+        size = self.tile_size
+        return self.level(index)[ty * size:(ty + 1) * size, tx * size:(tx + 1) * size]
+
+
+class TileCache:
+    """LRU cache of rendered tiles, bounded by their total size in bytes."""
+
+    def __init__(self, max_bytes=TILE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self._tiles = OrderedDict()
+
+    def get(self, key, render):
+        tile = self._tiles.get(key)
+        if tile is not None:
+            self._tiles.move_to_end(key)
+            self.hits += 1
+            return tile
+        self.misses += 1
+        tile = self._tiles[key] = render()
+        self.bytes += tile.nbytes
+        while self.bytes > self.max_bytes and len(self._tiles) > 1:
+            _, evicted = self._tiles.popitem(last=False)
+            self.bytes -= evicted.nbytes
+        return tile
+
+    def clear(self):
+        self._tiles.clear()
+        self.bytes = 0
+
+
+class TileRenderer:
+    """Draws regions of a pyramid, optionally through a point-operation ``table``.
+
+    Tables are applied per tile and the results kept in ``cache``; without a
+    table the pyramid levels are shown as they are.
+    """
+
+    def __init__(self, pyramid, table=None, cache=None):
+        self.pyramid = pyramid
+        self.table = table
+        self.cache = cache if cache is not None else TileCache()
+        self.key = next(_renderer_keys)
+
+    def _tile(self, level, tx, ty):
+        return self.cache.get((self.key, level, tx, ty),
+                              lambda: self.table[self.pyramid.tile(level, tx, ty)])
+
+    def region(self, level, x0, y0, x1, y1):
+        """Pixels [y0:y1, x0:x1] of ``level``, enhancing only the tiles they cover."""
+        source = self.pyramid.level(level)
+        if self.table is None:
+            return source[y0:y1, x0:x1]
+
+        size = self.pyramid.tile_size
+        out = np.empty((y1 - y0, x1 - x0) + source.shape[2:], dtype=self.table.dtype)
+        for ty in range(y0 // size, (y1 - 1) // size + 1):
+            for tx in range(x0 // size, (x1 - 1) // size + 1):
+                tile = self._tile(level, tx, ty)
+                # Overlap of this tile with the region, in level coordinates
+                left, top = max(x0, tx * size), max(y0, ty * size)
+                right, bottom = min(x1, tx * size + tile.shape[1]), min(y1, ty * size + tile.shape[0])
+                out[top - y0:bottom - y0, left - x0:right - x0] = \
+                    tile[top - ty * size:bottom - ty * size, left - tx * size:right - tx * size]
+        return out
+
+
+class Viewport:
+    """Zoom (screen pixels per image pixel) and centre of a view of ``view_size`` onto an image."""
+
+    def __init__(self, image_size, view_size, max_zoom=MAX_ZOOM):
+        self.image_size = image_size
+        self.view_size = view_size
+        self.max_zoom = max_zoom
+        self.fit()
+
+    @property
+    def fit_zoom(self):
+        return min(self.view_size[0] / self.image_size[0], self.view_size[1] / self.image_size[1], 1.0)
+
+    def fit(self):
+        self.zoom = self.fit_zoom
+        self.center = (self.image_size[0] / 2, self.image_size[1] / 2)
+
+    def _clamp(self):
+        # Keep the view on the image; an axis that fits entirely stays centred
+        center = []
+        for c, image, view in zip(self.center, self.image_size, self.view_size):
+            half = view / self.zoom / 2
+            center.append(image / 2 if half * 2 >= image else min(max(c, half), image - half))
+        self.center = tuple(center)
+
+    def zoom_at(self, factor, x, y):
+        """Zoom by ``factor`` keeping image point (x, y) where it is on screen."""
+        zoom = min(max(self.zoom * factor, self.fit_zoom), self.max_zoom)
+        ratio = self.zoom / zoom
+        self.center = (x - (x - self.center[0]) * ratio, y - (y - self.center[1]) * ratio)
+        self.zoom = zoom
+        self._clamp()
+
+    def pan(self, dx, dy):
+        """Move the image by (dx, dy) screen pixels."""
+        self.center = (self.center[0] - dx / self.zoom, self.center[1] - dy / self.zoom)
+        self._clamp()
+
+    def visible(self):
+        """(x0, y0, x1, y1) image coordinates of the part of the image on screen."""
+        half_w = self.view_size[0] / self.zoom / 2
+        half_h = self.view_size[1] / self.zoom / 2
+        return (max(self.center[0] - half_w, 0.0), max(self.center[1] - half_h, 0.0),
+                min(self.center[0] + half_w, self.image_size[0]), min(self.center[1] + half_h, self.image_size[1]))
+
+    def to_image(self, x, y):
+        """Image coordinates of point (x, y) of a rendered view, measured from its top-left corner.
+
+        The view must be shown at the size ``render_view`` returns it, unscaled.
+        """
+        x0, y0, _, _ = self.visible()
+        return x0 + x / self.zoom, y0 + y / self.zoom
+
+
+def render_view(renderer, viewport):
+    """The visible part of the image at the viewport's zoom, as an array of at most ``view_size``."""
+    from PIL import Image
+
+    x0, y0, x1, y1 = viewport.visible()
+    level = renderer.pyramid.level_for_zoom(viewport.zoom)
+    scale = 1 << level
+    lx0, ly0 = int(x0 // scale), int(y0 // scale)
+    height, width = renderer.pyramid.level(level).shape[:2]
+    lx1, ly1 = min(math.ceil(x1 / scale), width), min(math.ceil(y1 / scale), height)
+    region = renderer.region(level, lx0, ly0, lx1, ly1)
+
+    size = (max(1, round((x1 - x0) * viewport.zoom)), max(1, round((y1 - y0) * viewport.zoom)))
+    # Sub-pixel box, so the view moves smoothly when panning at high zoom
+    box = (x0 / scale - lx0, y0 / scale - ly0, x1 / scale - lx0, y1 / scale - ly0)
+    resample = Image.Resampling.NEAREST if viewport.zoom * scale >= 2 else Image.Resampling.BILINEAR
+    return np.asarray(Image.fromarray(np.ascontiguousarray(region)).resize(size, resample, box=box))
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Time panning a zoomed view across an image.")
+    parser.add_argument("image", help="Input image")
+    parser.add_argument("--enhancer", default="pdf", help="Registered enhancer with a table (default: pdf)")
+    parser.add_argument("--zoom", type=float, default=1.0, help="Screen pixels per image pixel (default: 1)")
+    parser.add_argument("--view", default="500x600", help="View size WxH (default: 500x600)")
+    parser.add_argument("--steps", type=int, default=50, help="Pan steps (default: 50)")
+    args = parser.parse_args(argv)
+
+    from NEW import load_image
+    from registry import get_enhancer
+    from stats import ImageStats
+
+    image_array = load_image(args.image)
+    enhancer = get_enhancer(args.enhancer)
+    start = time.perf_counter()
+    pyramid = TilePyramid(image_array).build()
+    table = enhancer.build_table(ImageStats.from_image(image_array).histogram)
+    setup = time.perf_counter() - start
+    if table is None:
+        parser.error(f"{args.enhancer} has no table; it is rendered at full resolution instead of per tile")
+
+    view_size = tuple(int(n) for n in args.view.lower().split("x"))
+    viewport = Viewport(pyramid.size, view_size)
+    viewport.zoom_at(args.zoom / viewport.zoom, viewport.center[0], viewport.center[1])
+    viewport.center = (0.0, 0.0)
+    viewport.pan(0, 0)
+    renderer = TileRenderer(pyramid, table)
+
+    times = []
+    step = max(1, pyramid.size[0] * viewport.zoom // args.steps)
+    for index in range(args.steps):
+        start = time.perf_counter()
+        render_view(renderer, viewport)
+        times.append(time.perf_counter() - start)
+        viewport.pan(-step, -step * (index % 2))
+    times = np.array(times) * 1000
+    print(f"{pyramid.size[0]}x{pyramid.size[1]}: pyramid and table in {setup * 1000:.0f} ms; "
+          f"{args.steps} views at zoom {viewport.zoom:g}: median {np.median(times):.1f} ms, max {times.max():.1f} ms "
+          f"({renderer.cache.misses} tiles enhanced, {renderer.cache.hits} from cache)")
+
+
+if __name__ == "__main__":
+    main()